@@ -14,6 +14,7 @@
         'data/ir_cron_data.xml',
         'views/hikvision_device_views.xml',
         'views/hikvision_log_views.xml',
+        'views/hikvision_sync_job_views.xml',
         'views/hr_employee_views.xml',
         'views/hikvision_menus.xml',
     ],
@@ -18,8 +18,7 @@ class AttendanceDashboard(models.Model):
     @api.model
     def get_departments(self):
         """Barcha bo'limlar ro'yxati"""
-        departments = self.env['hr.department'].search([])
-        return [{'id': d.id, 'name': d.name} for d in departments]
+        return self.env['hr.department'].search_read([], ['name'])
 
     @api.model
     def get_today_attendance_stats(self, department_id=None):
@@ -49,9 +48,9 @@ class AttendanceDashboard(models.Model):
         if department_id:
             att_domain.append(('employee_id.department_id', '=', department_id))
         
-        today_attendances = self.env['hr.attendance'].search(att_domain)
-        present_employee_ids = today_attendances.mapped('employee_id').ids
-        present_employees = len(set(present_employee_ids))
+        # Faqat distinct employee_id - attendance yozuvlari yuklanmaydi
+        present_groups = self.env['hr.attendance']._read_group(att_domain, ['employee_id'])
+        present_employees = len(present_groups)
         absent_employees = total_employees - present_employees
         
         return {
@@ -79,7 +78,8 @@ class AttendanceDashboard(models.Model):
         if department_id:
             emp_domain.append(('department_id', '=', department_id))
         
-        all_employees = self.env['hr.employee'].search(emp_domain)
+        # Faqat kerakli ustunlar o'qiladi (prefetch barcha fieldlarni yuklamaydi)
+        all_employees = self.env['hr.employee'].search_fetch(emp_domain, ['name', 'department_id'])
         
         # Bugun kelganlar
         att_domain = [
@@ -89,8 +89,9 @@ class AttendanceDashboard(models.Model):
         if department_id:
             att_domain.append(('employee_id.department_id', '=', department_id))
         
-        today_attendances = self.env['hr.attendance'].search(att_domain)
-        present_employee_ids = set(today_attendances.mapped('employee_id').ids)
+        # Faqat distinct employee_id - attendance yozuvlari yuklanmaydi
+        present_groups = self.env['hr.attendance']._read_group(att_domain, ['employee_id'])
+        present_employee_ids = {employee.id for employee, in present_groups}
         
         # Kelmaganlar
         absent_employees = []
@@ -292,7 +293,7 @@ class AttendanceDashboard(models.Model):
         if department_id:
             leave_domain.append(('employee_id.department_id', '=', department_id))
         
-        leaves = self.env['hr.leave'].search(leave_domain)
+        leaves = self.env['hr.leave'].search_fetch(leave_domain, ['employee_id', 'holiday_status_id'])
         
         on_leave_employees = []
         for leave in leaves:
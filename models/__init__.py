@@ -1,5 +1,7 @@
 from . import hikvision_api
 from . import hikvision_sync
+from . import hikvision_sync_job
+from . import hikvision_employee_sync_state
 from . import hikvision_attendance
 from . import hikvision_cron
 from . import hikvision_leave_sync
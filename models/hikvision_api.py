@@ -8,8 +8,12 @@ asosiy metodlarni o'z ichiga oladi.
 
 import json
 import logging
+import os
+import threading
+import time
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPDigestAuth
 
 from odoo import models
@@ -17,9 +21,27 @@ from odoo import models
 # Timeout sozlamalari
 DEFAULT_TIMEOUT = 10
 MULTIPART_TIMEOUT = 30
+# Bitta qurilma sessiyasidagi keep-alive ulanishlar soni (parallel thread'lar uchun)
+SESSION_POOL_SIZE = 4
 
 _logger = logging.getLogger(__name__)
 
+# Qurilma bo'yicha doimiy sessiyalar: {(pid, device_id): requests.Session}
+# Kalitda PID - fork qilingan worker ota jarayon soketlarini ishlatmasligi uchun
+_device_sessions = {}
+_sessions_lock = threading.Lock()
+
+# Qurilma bo'yicha token bucket: {device_id: (tokens, last_ts)}
+_rate_buckets = {}
+_rate_lock = threading.Lock()
+
+# Qurilma javob bermasligini bildiradigan requests xatolari
+CONNECTION_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+
+class HikvisionConnectionError(Exception):
+    """Qurilmaga ulanib bo'lmadi (ulanish xatosi yoki timeout) - keyingi so'rovlar ham o'tmaydi"""
+
 
 class HikvisionApiMixin(models.AbstractModel):
     """Hikvision API so'rovlari uchun mixin"""
@@ -32,6 +54,75 @@ class HikvisionApiMixin(models.AbstractModel):
         self.ensure_one()
         return f"http://{self.ip_address}:{self.port}/ISAPI/{endpoint}"
 
+    def _get_session(self):
+        """
+        Qurilma uchun doimiy requests.Session (jarayon ichida qayta ishlatiladi).
+        
+        Sessiyalar jarayon darajasidagi (pid, qurilma) keshida yashaydi - alohida
+        "sessiya bloki" yo'q: qurilmaga yuborilgan barcha so'rovlar (bulk yuklash
+        ham) shu bitta sessiyadan o'tadi. TCP ulanish (keep-alive) va digest auth
+        nonce so'rovlar va cron ishga tushishlari orasida saqlanadi. Login/parol
+        o'zgarsa sessiya qayta yaratiladi, _close_session() uni yopadi.
+        """
+        self.ensure_one()
+        key = (os.getpid(), self.id)
+        credentials = (self.username, self.password)
+        with _sessions_lock:
+            session = _device_sessions.get(key)
+            if session is not None and (session.auth.username, session.auth.password) != credentials:
+                session.close()
+                session = None
+            if session is None:
+                session = requests.Session()
+                session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=SESSION_POOL_SIZE))
+                session.auth = HTTPDigestAuth(*credentials)
+                _device_sessions[key] = session
+        return session
+
+    def _close_session(self):
+        """Qurilma sessiyasini yopish (ulanish sozlamalari o'zgarganda yoki o'chirilganda)."""
+        pid = os.getpid()
+        for device in self:
+            with _sessions_lock:
+                session = _device_sessions.pop((pid, device.id), None)
+            if session is not None:
+                session.close()
+
+    def _get_http_client(self):
+        """
+        So'rov yuborish uchun client va auth.
+        
+        Returns:
+            tuple: (requests.Session, None) - auth sessiyaning o'zida
+        """
+        return self._get_session(), None
+
+    def _throttle(self):
+        """
+        Qurilmaga so'rovlar tezligini cheklash (token bucket).
+        
+        Faqat context'da 'hikvision_rate_limit' (so'rov/sekund) berilganda ishlaydi -
+        navbat worker'i qurilmani so'rovlar bilan bosib qo'ymasligi uchun.
+        """
+        rate = self.env.context.get('hikvision_rate_limit')
+        if not rate:
+            return
+        
+        with _rate_lock:
+            now = time.monotonic()
+            tokens, last_ts = _rate_buckets.get(self.id, (rate, now))
+            tokens = min(rate, tokens + max(0.0, now - last_ts) * rate)
+            if tokens >= 1:
+                wait = 0.0
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+                tokens = 0.0
+            _rate_buckets[self.id] = (tokens, now + wait)
+        
+        if wait:
+            time.sleep(wait)
+
     def _make_request(self, method, endpoint, data=None, params=None):
         """
         Hikvision qurilmasiga HTTP so'rov yuborish.
@@ -46,26 +137,30 @@ class HikvisionApiMixin(models.AbstractModel):
             requests.Response object
         
         Raises:
-            Exception: Ulanish xatosi bo'lganda
+            HikvisionConnectionError: Qurilmaga ulanib bo'lmaganda (ulanish xatosi, timeout)
+            Exception: Boshqa HTTP xatolarida
         """
         self.ensure_one()
         
         url = self._get_isapi_url(endpoint)
-        auth = HTTPDigestAuth(self.username, self.password)
+        http, auth = self._get_http_client()
+        self._throttle()
         
         try:
             if method == 'GET':
-                response = requests.get(url, auth=auth, params=params, timeout=DEFAULT_TIMEOUT)
+                response = http.get(url, auth=auth, params=params, timeout=DEFAULT_TIMEOUT)
             elif method == 'POST':
-                response = requests.post(url, auth=auth, data=data, timeout=DEFAULT_TIMEOUT)
+                response = http.post(url, auth=auth, data=data, timeout=DEFAULT_TIMEOUT)
             elif method == 'PUT':
-                response = requests.put(url, auth=auth, data=data, timeout=DEFAULT_TIMEOUT)
+                response = http.put(url, auth=auth, data=data, timeout=DEFAULT_TIMEOUT)
             else:
                 raise ValueError(f"Unsupported HTTP method: {method}")
                 
             response.raise_for_status()
             return response
             
+        except CONNECTION_ERRORS as e:
+            raise HikvisionConnectionError(f"Connection failed: {str(e)}")
         except requests.exceptions.RequestException as e:
             raise Exception(f"Connection failed: {str(e)}")
     
@@ -85,16 +180,19 @@ class HikvisionApiMixin(models.AbstractModel):
         self.ensure_one()
         
         url = self._get_isapi_url(endpoint)
-        auth = HTTPDigestAuth(self.username, self.password)
+        http, auth = self._get_http_client()
+        self._throttle()
         
         headers = {}
         if content_type:
             headers['Content-Type'] = content_type
         
         try:
-            response = requests.post(url, auth=auth, data=data, headers=headers, timeout=MULTIPART_TIMEOUT)
+            response = http.post(url, auth=auth, data=data, headers=headers, timeout=MULTIPART_TIMEOUT)
             response.raise_for_status()
             return response
+        except CONNECTION_ERRORS as e:
+            raise HikvisionConnectionError(f"Upload error: {str(e)}")
         except requests.exceptions.RequestException as e:
             raise Exception(f"Upload error: {str(e)}")
     
@@ -115,15 +213,18 @@ class HikvisionApiMixin(models.AbstractModel):
         self.ensure_one()
         
         url = self._get_isapi_url(endpoint)
-        auth = HTTPDigestAuth(self.username, self.password)
+        http, auth = self._get_http_client()
+        self._throttle()
         
         headers = {}
         if content_type:
             headers['Content-Type'] = content_type
         
         try:
-            response = requests.put(url, auth=auth, data=data, headers=headers, timeout=MULTIPART_TIMEOUT)
+            response = http.put(url, auth=auth, data=data, headers=headers, timeout=MULTIPART_TIMEOUT)
             response.raise_for_status()
             return response
+        except CONNECTION_ERRORS as e:
+            raise HikvisionConnectionError(f"Update error: {str(e)}")
         except requests.exceptions.RequestException as e:
             raise Exception(f"Update error: {str(e)}")
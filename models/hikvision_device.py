@@ -10,7 +10,10 @@ import logging
 from urllib.parse import urlparse
 import json
 
-from odoo import models, fields
+from odoo import models, fields, api
+
+# O'zgarganda qurilmaning HTTP sessiyasi yopiladigan fieldlar
+CONNECTION_FIELDS = {'ip_address', 'port', 'username', 'password'}
 
 _logger = logging.getLogger(__name__)
 
@@ -52,11 +55,75 @@ class HikvisionDevice(models.Model):
              "avtomatik qurilmaga sinxronlanadi.\n"
              "O'chirilganda: Faqat qo'lda 'Xodimlarni Yuklash' tugmasi orqali sinxronlanadi."
     )
+    
+    # Background sync jarayoni (0-100%)
+    sync_progress = fields.Integer(
+        string='Sinxronizatsiya Progressi',
+        default=0,
+        readonly=True,
+        help="'Xodimlarni Yuklash' background jarayonining bajarilish foizi"
+    )
+    sync_in_progress = fields.Boolean(
+        string='Sinxronizatsiya Bajarilmoqda',
+        default=False,
+        readonly=True,
+        copy=False,
+        help="'Xodimlarni Yuklash' background jarayoni ishlayotganini bildiradi. "
+             "Bir vaqtda ikkinchi sinxronizatsiya ishga tushmaydi."
+    )
+    sync_heartbeat = fields.Datetime(
+        string='Sinxronizatsiya Heartbeat',
+        readonly=True,
+        copy=False,
+        help="Background sinxronizatsiya oxirgi marta faol bo'lgan vaqt. "
+             "Uzoq vaqt yangilanmasa 'Bajarilmoqda' bayrog'i eskirgan hisoblanadi."
+    )
+    preferred_face_endpoint = fields.Char(
+        string='Yuz Yuklash Endpointi',
+        readonly=True,
+        copy=False,
+        help="Ushbu qurilmada oxirgi marta muvaffaqiyatli ishlagan yuz yuklash endpointi. "
+             "Keyingi yuklashlarda birinchi bo'lib sinaladi."
+    )
+
+    # =====================================================
+    # ORM OVERRIDES
+    # =====================================================
+
+    def write(self, vals):
+        result = super().write(vals)
+        if CONNECTION_FIELDS & set(vals):
+            self._close_session()
+        return result
+
+    def unlink(self):
+        self._close_session()
+        return super().unlink()
 
     # =====================================================
     # HELPER METHODS
     # =====================================================
     
+    @api.model
+    def _get_active_device_ids(self, auto_sync_only=True):
+        """
+        Tasdiqlangan (va ixtiyoriy ravishda auto_sync yoqilgan) qurilmalar ID'lari.
+        
+        Bitta indekslangan so'rov - keshlanmaydi (registry keshini tozalash undan qimmat).
+        
+        Returns:
+            tuple: Qurilma ID'lari
+        """
+        domain = [('state', '=', 'confirmed')]
+        if auto_sync_only:
+            domain.append(('auto_sync_enabled', '=', True))
+        return tuple(self.sudo().search(domain).ids)
+    
+    @api.model
+    def _get_active_devices(self, auto_sync_only=True):
+        """Aktiv qurilmalar recordseti."""
+        return self.browse(self._get_active_device_ids(auto_sync_only))
+    
     def _notify(self, title, message, notif_type='success', sticky=False):
         """Foydalanuvchiga xabar ko'rsatish."""
         return {
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Hikvision Employee Sync State
+
+Har bir (xodim, qurilma) juftligi uchun qurilmaga oxirgi marta muvaffaqiyatli
+yuborilgan ma'lumotlar. Worker shu bilan solishtirib, qurilmadagi bilan bir xil
+ma'lumotlarni qayta yubormaydi.
+"""
+
+from odoo import models, fields, api
+
+
+class HikvisionEmployeeSyncState(models.Model):
+    """Xodimning qurilmadagi oxirgi sinxronlangan holati"""
+
+    _name = 'hikvision.employee.sync.state'
+    _description = 'Hikvision Employee Sync State'
+
+    employee_id = fields.Many2one('hr.employee', string='Employee', required=True,
+                                  ondelete='cascade', index=True)
+    device_id = fields.Many2one('hikvision.device', string='Device', required=True,
+                                ondelete='cascade', index=True)
+    synced_name = fields.Char(string='Sinxronlangan ism')
+    synced_barcode = fields.Char(string='Sinxronlangan barcode')
+    synced_image_hash = fields.Char(string='Sinxronlangan rasm hash')
+    last_sync = fields.Datetime(string='Oxirgi sinxronlash')
+
+    _employee_device_uniq = models.Constraint(
+        'unique(employee_id, device_id)',
+        "Har bir xodim va qurilma uchun bitta holat yozuvi bo'lishi kerak.",
+    )
+
+    @api.model
+    def _get_states(self, device, employees):
+        """{employee_id: sync state} - berilgan qurilma va xodimlar uchun"""
+        states = self.search([
+            ('device_id', '=', device.id),
+            ('employee_id', 'in', employees.ids),
+        ])
+        return {state.employee_id.id: state for state in states}
+
+    @api.model
+    def _filter_unsynced(self, device, employees, op_type):
+        """
+        Qurilmadagi holati joriy ma'lumotlardan farq qiladigan xodimlar.
+
+        upload_user - ism yoki barcode o'zgargan, upload_face - rasm hash'i o'zgargan.
+        Boshqa amallar filtrlanmaydi.
+        """
+        if op_type not in ('upload_user', 'upload_face'):
+            return employees
+
+        states = self._get_states(device, employees)
+        if op_type == 'upload_user':
+            return employees.filtered(
+                lambda e: e.id not in states
+                or (states[e.id].synced_name, states[e.id].synced_barcode) != (e.name, e.barcode)
+            )
+        get_hash = employees._get_hikvision_image_hash
+        return employees.filtered(
+            lambda e: e.id not in states
+            or states[e.id].synced_image_hash != get_hash(e.image_1920)
+        )
+
+    @api.model
+    def _filter_unsynced_on_devices(self, devices, employees, op_type):
+        """Kamida bitta qurilmada holati joriy ma'lumotlardan farq qiladigan xodimlar"""
+        unsynced = employees.browse()
+        for device in devices:
+            unsynced |= self._filter_unsynced(device, employees - unsynced, op_type)
+        return unsynced
+
+    @api.model
+    def _record_synced(self, device, employees, op_type):
+        """Muvaffaqiyatli amaldan keyin (xodim, qurilma) holatini yangilash."""
+        if not employees:
+            return
+
+        now = fields.Datetime.now()
+        states = self._get_states(device, employees)
+        vals_list = []
+        for employee in employees:
+            if op_type == 'upload_user':
+                vals = {'synced_name': employee.name, 'synced_barcode': employee.barcode}
+            elif op_type == 'upload_face':
+                vals = {'synced_image_hash': employee._get_hikvision_image_hash(employee.image_1920)}
+            elif op_type == 'delete_face':
+                vals = {'synced_image_hash': False}
+            else:
+                continue
+            vals['last_sync'] = now
+
+            if employee.id in states:
+                states[employee.id].write(vals)
+            else:
+                vals.update(employee_id=employee.id, device_id=device.id)
+                vals_list.append(vals)
+
+        if vals_list:
+            self.create(vals_list)
+
+    @api.model
+    def _clear_synced(self, device, employees=None, barcode=None):
+        """
+        Qurilmadan o'chirilgan foydalanuvchining holatini tozalash.
+
+        Holat qolib ketsa _filter_unsynced keyingi yuklashni o'tkazib yuboradi va
+        xodim qurilmaga qaytmaydi. Xodim o'chirilgan bo'lishi mumkin - shuning
+        uchun qurilmaga yuborilgan barcode bo'yicha ham qidiriladi.
+        """
+        domain = [('device_id', '=', device.id)]
+        if employees and barcode:
+            domain += ['|', ('employee_id', 'in', employees.ids), ('synced_barcode', '=', barcode)]
+        elif employees:
+            domain.append(('employee_id', 'in', employees.ids))
+        elif barcode:
+            domain.append(('synced_barcode', '=', barcode))
+        else:
+            return
+        self.search(domain).unlink()
+
+    @api.model
+    def _reset_device(self, device_id):
+        """
+        Qurilmaning barcha holat yozuvlarini o'chirish (qo'lda to'liq sinxronlash).
+
+        Qurilmada Odoo'dan tashqari o'chirilgan foydalanuvchi uchun holat "sinxronlangan"
+        bo'lib qoladi - tozalangach keyingi yuklash ma'lumotlarni majburan qayta yuboradi.
+        """
+        self.search([('device_id', '=', device_id)]).unlink()
@@ -19,9 +19,27 @@ from datetime import datetime
 from odoo import models, fields, api, SUPERUSER_ID
 from odoo.modules.registry import Registry
 from .hikvision_logger import log_cron, log_sync, log_info, log_error
+from .hikvision_api import HikvisionConnectionError
 
 _logger = logging.getLogger(__name__)
 
+# Bitta UserInfo/Modify so'rovida yuboriladigan foydalanuvchilar soni
+USER_MODIFY_BATCH_SIZE = 30
+
+# Bloklash va qayta yoqish uchun UserInfo maydonlari (employeeNo'dan tashqari)
+BLOCKED_USER_INFO = {
+    "userType": "blackList",
+}
+ENABLED_USER_INFO = {
+    "userType": "normal",
+    "Valid": {
+        "enable": True,
+        "beginTime": "2020-01-01T00:00:00",
+        "endTime": "2030-12-31T23:59:59",
+        "timeType": "local"
+    },
+}
+
 
 class HikvisionLeaveSyncMixin(models.AbstractModel):
     """Hikvision leave sync metodlari uchun mixin"""
@@ -37,10 +55,7 @@ class HikvisionLeaveSyncMixin(models.AbstractModel):
             raise Exception(f"Xodimda barcode mavjud emas: {employee.name}")
         
         user_data = {
-            "UserInfo": {
-                "employeeNo": str(employee.barcode),
-                "userType": "blackList"
-            }
+            "UserInfo": dict(BLOCKED_USER_INFO, employeeNo=str(employee.barcode))
         }
         
         self._make_request('PUT', 'AccessControl/UserInfo/Modify?format=json', 
@@ -55,22 +70,79 @@ class HikvisionLeaveSyncMixin(models.AbstractModel):
             raise Exception(f"Xodimda barcode mavjud emas: {employee.name}")
         
         user_data = {
-            "UserInfo": {
-                "employeeNo": str(employee.barcode),
-                "userType": "normal",
-                "Valid": {
-                    "enable": True,
-                    "beginTime": "2020-01-01T00:00:00",
-                    "endTime": "2030-12-31T23:59:59",
-                    "timeType": "local"
-                }
-            }
+            "UserInfo": dict(ENABLED_USER_INFO, employeeNo=str(employee.barcode))
         }
         
         self._make_request('PUT', 'AccessControl/UserInfo/Modify?format=json', 
                           data=json.dumps(user_data))
         _logger.info(f"Hikvision [{self.name}]: {employee.name} yoqildi")
     
+    def _modify_users_bulk(self, employees, user_info, fallback):
+        """
+        Bir nechta xodimning UserInfo'sini USER_MODIFY_BATCH_SIZE tadan bitta
+        UserInfoList so'rovi bilan o'zgartirish.
+        
+        UserInfoList'ni qabul qilmaydigan qurilmalar uchun shu guruh xodimlari
+        fallback(employee) orqali bittadan yuboriladi.
+        
+        Returns:
+            dict: {employee_id: xato matni} - faqat xato bo'lgan xodimlar
+        """
+        self.ensure_one()
+        errors = {
+            employee.id: f"Xodimda barcode mavjud emas: {employee.name}"
+            for employee in employees if not employee.barcode
+        }
+        employees = employees.filtered('barcode')
+        
+        for start in range(0, len(employees), USER_MODIFY_BATCH_SIZE):
+            batch = employees[start:start + USER_MODIFY_BATCH_SIZE]
+            remaining = employees[start:]
+            user_data = {
+                "UserInfoList": [
+                    dict(user_info, employeeNo=str(employee.barcode)) for employee in batch
+                ]
+            }
+            try:
+                self._make_request('PUT', 'AccessControl/UserInfo/Modify?format=json',
+                                  data=json.dumps(user_data))
+                _logger.info(f"Hikvision [{self.name}]: {len(batch)} ta xodim yangilandi (bulk)")
+                continue
+            except HikvisionConnectionError as e:
+                # Qurilma javob bermayapti - qolgan guruhlar uchun timeout kutilmaydi
+                errors.update(dict.fromkeys(remaining.ids, str(e)))
+                break
+            except Exception as e:
+                _logger.warning(f"Hikvision [{self.name}]: Bulk UserInfo/Modify ishlamadi, bittadan yuborilmoqda - {str(e)}")
+            
+            for index, employee in enumerate(batch):
+                try:
+                    fallback(employee)
+                except HikvisionConnectionError as e:
+                    errors.update(dict.fromkeys(remaining[index:].ids, str(e)))
+                    return errors
+                except Exception as e:
+                    errors[employee.id] = str(e)
+        return errors
+    
+    def _disable_users_bulk(self, employees):
+        """
+        Bir nechta xodimni qurilmada bloklash (UserInfoList, 30 tadan).
+        
+        Returns:
+            dict: {employee_id: xato matni} - faqat xato bo'lgan xodimlar
+        """
+        return self._modify_users_bulk(employees, BLOCKED_USER_INFO, self._disable_user_on_device)
+    
+    def _enable_users_bulk(self, employees):
+        """
+        Bir nechta xodimni qurilmada qayta yoqish (UserInfoList, 30 tadan).
+        
+        Returns:
+            dict: {employee_id: xato matni} - faqat xato bo'lgan xodimlar
+        """
+        return self._modify_users_bulk(employees, ENABLED_USER_INFO, self._enable_user_on_device)
+    
     def _get_expected_status(self, employee, today, weekday, employees_on_leave_ids, is_public_holiday):
         """Xodimning kutilgan holatini aniqlash."""
         if employee.id in employees_on_leave_ids:
@@ -6,16 +6,154 @@ Bu mixin xodimlarni Hikvision qurilmasiga sinxronizatsiya qilish,
 yuz rasmlarini yuklash va boshqarish uchun metodlarni o'z ichiga oladi.
 """
 
+import io
 import json
 import base64
 import logging
 import threading
+import time
+from datetime import timedelta
 
-from odoo import models, api, SUPERUSER_ID
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    # orjson o'rnatilmagan bo'lsa - standart json (bytes qaytaradi)
+    def _dumps(obj):
+        return json.dumps(obj).encode('utf-8')
+    _loads = json.loads
+
+from PIL import Image
+
+from odoo import models, fields, api, SUPERUSER_ID
 from odoo.modules.registry import Registry
 
+from .hikvision_api import HikvisionConnectionError
+
+# Background sync'da bir vaqtda xotiraga olinadigan xodimlar soni
+SYNC_CHUNK_SIZE = 50
+# Progress notification'lar orasidagi minimal vaqt (sekund)
+PROGRESS_NOTIFY_INTERVAL = 5
+# "Xodimlarni Yuklash" uchun Postgres advisory lock kaliti (qurilma id bilan birga)
+SYNC_LOCK_KEY = 7311
+# sync_heartbeat shuncha vaqt yangilanmasa sync_in_progress bayrog'i eskirgan hisoblanadi
+# (server qayta ishga tushgan yoki worker o'lgan)
+SYNC_STALE_TIMEOUT = timedelta(minutes=30)
+# Qurilmaga yuklanadigan yuz rasmi: maksimal o'lcham va JPEG sifati
+FACE_MAX_SIZE = (640, 480)
+FACE_JPEG_QUALITY = 85
+
 _logger = logging.getLogger(__name__)
 
+# Multipart body'ning o'zgarmas qismlari (har bir xodim uchun bir xil)
+_MP_BOUNDARY = b'----HikvisionBoundaryABC123'
+_MP_CONTENT_TYPE = 'multipart/form-data; boundary=' + _MP_BOUNDARY.decode()
+_MP_PART1 = (b'--' + _MP_BOUNDARY + b'\r\n'
+             b'Content-Disposition: form-data; name="FaceDataRecord"\r\n'
+             b'Content-Type: application/json\r\n\r\n')
+_MP_IMG_HDR = (b'\r\n--' + _MP_BOUNDARY + b'\r\n'
+               b'Content-Disposition: form-data; name="%s"; filename="face.jpg"\r\n'
+               b'Content-Type: image/jpeg\r\n\r\n')
+_MP_TAIL = b'\r\n--' + _MP_BOUNDARY + b'--\r\n'
+
+# UserInfo JSON shabloni - faqat employeeNo va name o'zgaradi
+_USER_INFO_TMPL = (
+    b'{"UserInfo":{"employeeNo":%s,"name":%s,"userType":"normal",'
+    b'"Valid":{"enable":true,"beginTime":"2020-01-01T00:00:00",'
+    b'"endTime":"2030-12-31T23:59:59","timeType":"local"},'
+    b'"doorRight":"1","RightPlan":[{"doorNo":1,"planTemplateNo":"1"}]}}'
+)
+
+
+class HikvisionImageError(Exception):
+    """Xodim rasmi yo'q yoki qurilmaga yuklab bo'lmaydigan formatda"""
+
+
+class _MultipartStream(io.RawIOBase):
+    """
+    Multipart body qismlarini bitta katta buferga birlashtirmasdan yuborish uchun stream.
+    
+    Rasm baytlari nusxalanmaydi - urllib3 qismlarni bloklab o'qib socketga yozadi.
+    Seek qo'llab-quvvatlanadi: HTTPDigestAuth 401 javobidan keyin body'ni qayta yuboradi.
+    """
+    
+    def __init__(self, parts):
+        super().__init__()
+        self._parts = [memoryview(part) for part in parts]
+        self._length = sum(len(part) for part in self._parts)
+        self._pos = 0
+    
+    def __len__(self):
+        return self._length
+    
+    def readable(self):
+        return True
+    
+    def seekable(self):
+        return True
+    
+    def tell(self):
+        return self._pos
+    
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._length
+        self._pos = max(0, min(offset, self._length))
+        return self._pos
+    
+    def readinto(self, buffer):
+        size = len(buffer)
+        offset = self._pos
+        written = 0
+        for part in self._parts:
+            if written >= size:
+                break
+            if offset >= len(part):
+                offset -= len(part)
+                continue
+            count = min(len(part) - offset, size - written)
+            buffer[written:written + count] = part[offset:offset + count]
+            written += count
+            offset = 0
+        self._pos += written
+        return written
+
+
+def _send_user_notification(db_registry, user_id, payload):
+    """
+    Foydalanuvchiga bus notification'ni alohida qisqa tranzaksiyada yuborish.
+    
+    Background jarayonning uzoq ochiq turgan cursor'i ishlatilmaydi.
+    """
+    with db_registry.cursor() as notif_cr:
+        notif_env = api.Environment(notif_cr, user_id, {})
+        notif_env['bus.bus']._sendone(notif_env.user.partner_id, 'simple_notification', payload)
+        notif_cr.commit()
+
+
+def _send_sync_progress(db_registry, user_id, device_id, done, total):
+    """
+    Sync progress'ini (va heartbeat'ini) qurilmaga yozish va foydalanuvchiga qisqa xabar yuborish.
+    
+    Alohida qisqa tranzaksiya ishlatiladi - asosiy sync cursor'i bloklanmaydi.
+    """
+    with db_registry.cursor() as notif_cr:
+        notif_env = api.Environment(notif_cr, user_id, {})
+        notif_env['hikvision.device'].browse(device_id).sudo().write({
+            'sync_progress': int(done / total * 100),
+            'sync_heartbeat': fields.Datetime.now(),
+        })
+        notif_env['bus.bus']._sendone(notif_env.user.partner_id, 'simple_notification', {
+            'title': '🔄 Sinxronizatsiya…',
+            'message': f'{done}/{total}',
+            'type': 'info',
+            'sticky': False,
+        })
+        notif_cr.commit()
+
 
 class HikvisionSyncMixin(models.AbstractModel):
     """Hikvision user/face sync metodlari uchun mixin"""
@@ -23,6 +161,22 @@ class HikvisionSyncMixin(models.AbstractModel):
     _name = 'hikvision.sync.mixin'
     _description = 'Hikvision Sync Mixin'
 
+    def _is_sync_running(self):
+        """
+        Background sync ishlayaptimi.
+
+        Bayroq faqat worker thread'ning finally blokida tushiriladi - server qayta
+        ishga tushsa yoki worker o'lsa TRUE qolib ketadi. Heartbeat
+        SYNC_STALE_TIMEOUT dan eski bo'lsa bayroq e'tiborga olinmaydi.
+        """
+        self.ensure_one()
+        if not self.sync_in_progress:
+            return False
+        if self.sync_heartbeat and fields.Datetime.now() - self.sync_heartbeat < SYNC_STALE_TIMEOUT:
+            return True
+        _logger.warning(f"Hikvision: {self.name} - eskirgan sync_in_progress bayrog'i e'tiborga olinmadi")
+        return False
+
     def action_sync_users(self):
         """
         Odoo xodimlarini Hikvision qurilmasiga sinxronizatsiya qilish.
@@ -32,6 +186,13 @@ class HikvisionSyncMixin(models.AbstractModel):
         """
         self.ensure_one()
         
+        # Bir qurilma uchun bir vaqtda faqat bitta sync (double-click, bir necha admin)
+        self.env.cr.execute("SELECT pg_try_advisory_xact_lock(%s, %s)", (SYNC_LOCK_KEY, self.id))
+        if not self.env.cr.fetchone()[0] or self._is_sync_running():
+            return self._notify('Sinxronizatsiya', 
+                              'Sinxronizatsiya allaqachon bajarilmoqda', 
+                              'warning')
+        
         employees = self.env['hr.employee'].search([
             ('barcode', '!=', False),
             ('active', '=', True)
@@ -60,6 +221,19 @@ class HikvisionSyncMixin(models.AbstractModel):
         user_id = self.env.user.id
         employee_ids = new_employees.ids
         
+        # Bayroq darhol commit qilinadi - boshqa workerlar ham ko'rishi uchun.
+        # Qo'lda sync majburiy: holat yozuvlari shu tranzaksiyada tozalanadi, background
+        # thread esa yuklaganlarini qaytadan yozadi
+        with self.env.registry.cursor() as flag_cr:
+            flag_cr.execute(
+                "UPDATE hikvision_device SET sync_in_progress = TRUE, sync_progress = 0, "
+                "sync_heartbeat = (now() at time zone 'UTC') WHERE id = %s",
+                (device_id,)
+            )
+            self.env(cr=flag_cr)['hikvision.employee.sync.state'].sudo()._reset_device(device_id)
+        self.invalidate_recordset(['sync_in_progress', 'sync_progress', 'sync_heartbeat'])
+        self.env['hikvision.employee.sync.state'].invalidate_model()
+        
         def sync_in_background():
             """Background threadda xodimlarni yuklash"""
             try:
@@ -67,40 +241,69 @@ class HikvisionSyncMixin(models.AbstractModel):
                 with db_registry.cursor() as cr:
                     env = api.Environment(cr, user_id, {})
                     device = env['hikvision.device'].browse(device_id)
+                    SyncState = env['hikvision.employee.sync.state'].sudo()
                     
                     if not device.exists():
                         _logger.error("Hikvision: Qurilma topilmadi")
                         return
                     
-                    employees_to_sync = env['hr.employee'].browse(employee_ids)
-                    
                     success_count = 0
                     face_success_count = 0
                     error_count = 0
                     face_errors = []
                     
-                    total = len(employees_to_sync)
+                    total = len(employee_ids)
                     _logger.info(f"Hikvision: Background sync boshlandi - {total} ta xodim")
                     
-                    for idx, emp in enumerate(employees_to_sync, 1):
-                        try:
-                            device._upload_user_info_new(emp)
-                            success_count += 1
+                    idx = 0
+                    last_notif_ts = time.monotonic()
+                    # Xodimlarni bo'laklab olish - rasmlar xotirada to'planib qolmasligi uchun
+                    for start in range(0, total, SYNC_CHUNK_SIZE):
+                        chunk = env['hr.employee'].browse(employee_ids[start:start + SYNC_CHUNK_SIZE])
+                        chunk.read(['barcode', 'name', 'image_1920'])
+                        user_synced_ids = []
+                        face_synced_ids = []
+                        
+                        for emp in chunk:
+                            idx += 1
+                            try:
+                                device._upload_user_info_new(emp)
+                                success_count += 1
+                                user_synced_ids.append(emp.id)
+                                
+                                if emp.image_1920:
+                                    try:
+                                        device._upload_face_data_new(emp)
+                                        face_success_count += 1
+                                        face_synced_ids.append(emp.id)
+                                    except Exception as face_err:
+                                        face_errors.append(f"{emp.name}: {str(face_err)}")
+                                
+                                # Har 10 ta xodimdan keyin progress log
+                                if idx % 10 == 0:
+                                    _logger.info(f"Hikvision: Progress - {idx}/{total} ({int(idx/total*100)}%)")
+                                        
+                            except Exception as e:
+                                error_count += 1
+                                _logger.error(f"Hikvision: {emp.name} xatosi - {str(e)}")
                             
-                            if emp.image_1920:
+                            # Har PROGRESS_NOTIFY_INTERVAL sekundda foydalanuvchiga progress
+                            if time.monotonic() - last_notif_ts > PROGRESS_NOTIFY_INTERVAL:
+                                last_notif_ts = time.monotonic()
                                 try:
-                                    device._upload_face_data_new(emp)
-                                    face_success_count += 1
-                                except Exception as face_err:
-                                    face_errors.append(f"{emp.name}: {str(face_err)}")
-                            
-                            # Har 10 ta xodimdan keyin progress log
-                            if idx % 10 == 0:
-                                _logger.info(f"Hikvision: Progress - {idx}/{total} ({int(idx/total*100)}%)")
-                                    
-                        except Exception as e:
-                            error_count += 1
-                            _logger.error(f"Hikvision: {emp.name} xatosi - {str(e)}")
+                                    _send_sync_progress(db_registry, user_id, device_id, idx, total)
+                                except Exception as notif_err:
+                                    _logger.warning(f"Hikvision: Progress xabarini yuborishda xato - {str(notif_err)}")
+                        
+                        # Yuklanganlar holati (rasm hash'i uchun image_1920 hali keshda)
+                        SyncState._record_synced(device, chunk.browse(user_synced_ids), 'upload_user')
+                        SyncState._record_synced(device, chunk.browse(face_synced_ids), 'upload_face')
+                        
+                        # Bo'lak yakunida commit va rasm keshini tozalash
+                        cr.commit()
+                        chunk.invalidate_recordset(['image_1920'])
+                    
+                    device.sync_progress = 100
                     
                     # Yakuniy natija
                     _logger.info(f"Hikvision: Sync yakunlandi - Yuklandi: {success_count}, Yuzlar: {face_success_count}, Xatolar: {error_count}")
@@ -120,23 +323,25 @@ class HikvisionSyncMixin(models.AbstractModel):
                     
                     notif_type = 'success' if error_count == 0 and not face_errors else 'warning'
                     
-                    # Bus notification yuborish
-                    user = env['res.users'].browse(user_id)
-                    env['bus.bus']._sendone(
-                        user.partner_id,
-                        'simple_notification',
-                        {
-                            'title': '✅ Sinxronizatsiya yakunlandi',
-                            'message': '. '.join(msg_parts),
-                            'type': notif_type,
-                            'sticky': error_count > 0,
-                        }
-                    )
-                    
-                    cr.commit()
-                    
+                    # Bus notification - sync cursor'idan alohida, qisqa tranzaksiyada
+                    _send_user_notification(db_registry, user_id, {
+                        'title': '✅ Sinxronizatsiya yakunlandi',
+                        'message': '. '.join(msg_parts),
+                        'type': notif_type,
+                        'sticky': error_count > 0,
+                    })
+
             except Exception as e:
                 _logger.error(f"Hikvision: Background sync xatosi - {str(e)}")
+            finally:
+                try:
+                    with Registry(db_name).cursor() as flag_cr:
+                        flag_cr.execute(
+                            "UPDATE hikvision_device SET sync_in_progress = FALSE WHERE id = %s",
+                            (device_id,)
+                        )
+                except Exception as e:
+                    _logger.error(f"Hikvision: sync_in_progress bayrog'ini tushirishda xato - {str(e)}")
         
         # Threadni ishga tushirish
         thread = threading.Thread(target=sync_in_background, daemon=True)
@@ -160,10 +365,11 @@ class HikvisionSyncMixin(models.AbstractModel):
         """
         self.ensure_one()
         
-        employees = self.env['hr.employee'].search([
+        # Faqat arzon fieldlar o'qiladi - image_1920 keyinroq, faqat yangilari uchun
+        employees = self.env['hr.employee'].search_read([
             ('barcode', '!=', False),
             ('active', '=', True)
-        ])
+        ], ['id', 'barcode', 'name'])
         
         if not employees:
             return self._notify('Xodimlar topilmadi', 
@@ -172,31 +378,40 @@ class HikvisionSyncMixin(models.AbstractModel):
         
         existing_employee_nos = self._get_existing_employees()
         
+        new_ids = [e['id'] for e in employees if str(e['barcode']) not in existing_employee_nos]
+        
+        # Qo'lda sync majburiy - holat yozuvlari tozalanib, yuklanganlari qayta yoziladi
+        SyncState = self.env['hikvision.employee.sync.state'].sudo()
+        SyncState._reset_device(self.id)
+        user_synced = self.env['hr.employee']
+        face_synced = self.env['hr.employee']
+        
         success_count = 0
         face_success_count = 0
-        skipped_count = 0
+        skipped_count = len(employees) - len(new_ids)
         error_count = 0
         face_errors = []
         
-        for emp in employees:
+        for emp in self.env['hr.employee'].browse(new_ids):
             try:
-                if str(emp.barcode) in existing_employee_nos:
-                    skipped_count += 1
-                    continue
-                
                 self._upload_user_info_new(emp)
                 success_count += 1
+                user_synced |= emp
                 
                 if emp.image_1920:
                     try:
                         self._upload_face_data_new(emp)
                         face_success_count += 1
+                        face_synced |= emp
                     except Exception as face_err:
                         face_errors.append(f"{emp.name}: {str(face_err)}")
                         
             except Exception as e:
                 error_count += 1
         
+        SyncState._record_synced(self, user_synced, 'upload_user')
+        SyncState._record_synced(self, face_synced, 'upload_face')
+        
         msg_parts = []
         if skipped_count > 0:
             msg_parts.append(f'Mavjud: {skipped_count} ta (o\'tkazib yuborildi)')
@@ -224,10 +439,8 @@ class HikvisionSyncMixin(models.AbstractModel):
         Qurilmadagi mavjud xodimlar ro'yxatini olish.
         
         Returns:
-            set: Mavjud employeeNo'lar to'plami
+            frozenset: Mavjud employeeNo'lar to'plami
         """
-        import json
-        
         existing = set()
         position = 0
         batch_size = 100
@@ -243,8 +456,8 @@ class HikvisionSyncMixin(models.AbstractModel):
                 }
                 
                 response = self._make_request('POST', 'AccessControl/UserInfo/Search?format=json', 
-                                             data=json.dumps(search_data))
-                data = response.json()
+                                             data=_dumps(search_data))
+                data = _loads(response.content)
                 
                 user_info_search = data.get('UserInfoSearch', {})
                 total_matches = user_info_search.get('totalMatches', 0)
@@ -253,10 +466,11 @@ class HikvisionSyncMixin(models.AbstractModel):
                 if not user_info_list:
                     break
                 
-                for user in user_info_list:
-                    emp_no = user.get('employeeNo')
-                    if emp_no:
-                        existing.add(str(emp_no))
+                existing.update(
+                    str(emp_no)
+                    for emp_no in (user.get('employeeNo') for user in user_info_list)
+                    if emp_no
+                )
                 
                 position += len(user_info_list)
                 
@@ -266,7 +480,17 @@ class HikvisionSyncMixin(models.AbstractModel):
         except Exception as e:
             _logger.warning(f"Hikvision: Mavjud xodimlarni olishda xato: {str(e)}")
         
-        return existing
+        return frozenset(existing)
+    
+    def _build_user_info_body(self, employee):
+        """
+        UserInfo so'rov body'sini shablondan yaratish.
+        
+        Returns:
+            bytes: Tayyor JSON body
+        """
+        # _dumps faqat string qiymatlarni xavfsiz escape qilish uchun
+        return _USER_INFO_TMPL % (_dumps(str(employee.barcode)), _dumps(employee.name or ''))
     
     def _upload_user_info_new(self, employee):
         """
@@ -275,47 +499,23 @@ class HikvisionSyncMixin(models.AbstractModel):
         Faqat POST (Record) ishlatadi - PUT (Modify) o'tkazib yuboriladi.
         Bu har bir xodim uchun 10 sekund tejaydi.
         """
-        import json
-        
-        user_data = {
-            "UserInfo": {
-                "employeeNo": employee.barcode,
-                "name": employee.name,
-                "userType": "normal",
-                "Valid": {
-                    "enable": True,
-                    "beginTime": "2020-01-01T00:00:00",
-                    "endTime": "2030-12-31T23:59:59",
-                    "timeType": "local"
-                },
-                "doorRight": "1",
-                "RightPlan": [{
-                    "doorNo": 1,
-                    "planTemplateNo": "1"
-                }]
-            }
-        }
+        user_data = self._build_user_info_body(employee)
         
-        self._make_request('POST', 'AccessControl/UserInfo/Record?format=json', data=json.dumps(user_data))
+        self._make_request('POST', 'AccessControl/UserInfo/Record?format=json', data=user_data)
         _logger.info(f"Hikvision: {employee.name} - yangi xodim yaratildi")
     
-    def _upload_face_data_new(self, employee):
-        """
-        Yangi xodim yuz rasmini Hikvision qurilmasiga yuklash.
-        
-        Faqat POST (yaratish) ishlatadi - DELETE va PUT o'tkazib yuboriladi.
-        Bu har bir xodim uchun 40-60 sekund tejaydi.
+    def _prepare_face_jpeg(self, image_data):
         """
-        import io
-        import json
-        from PIL import Image
+        Xodim rasmini (base64) qurilmaga yuklash uchun JPEG ga aylantirish.
         
-        _logger.info(f"Hikvision: Yangi yuz rasmi yuklash - {employee.name}")
-        
-        image_data = employee.image_1920
+        Args:
+            image_data: employee.image_1920 qiymati (base64 str yoki bytes)
         
+        Returns:
+            bytes: 640x480 dan katta bo'lmagan JPEG rasm
+        """
         if not image_data:
-            raise Exception(f"Xodimda rasm mavjud emas")
+            raise HikvisionImageError("Xodimda rasm mavjud emas")
         
         # Base64 string ni olish
         if isinstance(image_data, bytes):
@@ -327,38 +527,51 @@ class HikvisionSyncMixin(models.AbstractModel):
         try:
             image_bytes = base64.b64decode(image_base64)
         except Exception as e:
-            raise Exception(f"Base64 decode xatosi: {str(e)}")
+            raise HikvisionImageError(f"Base64 decode xatosi: {str(e)}")
         
         # Rasmni JPEG formatga convert qilish
         try:
+            max_size = FACE_MAX_SIZE
             img = Image.open(io.BytesIO(image_bytes))
             
-            if img.mode in ('RGBA', 'P'):
-                img = img.convert('RGB')
-            elif img.mode != 'RGB':
+            # Kichik RGB JPEG qurilmaga o'zgartirmasdan yuboriladi - decode/encode kerak emas
+            if (img.format == 'JPEG' and img.mode == 'RGB'
+                    and img.size[0] <= max_size[0] and img.size[1] <= max_size[1]):
+                return image_bytes
+            
+            # JPEG uchun libjpeg o'zi kichraytirib decode qiladi (1/2, 1/4, 1/8)
+            img.draft('RGB', max_size)
+            
+            if img.mode != 'RGB':
                 img = img.convert('RGB')
             
-            max_size = (640, 480)
             if img.size[0] > max_size[0] or img.size[1] > max_size[1]:
-                img.thumbnail(max_size, Image.Resampling.LANCZOS)
+                img.thumbnail(max_size, Image.Resampling.BILINEAR)
             
             output_buffer = io.BytesIO()
-            img.save(output_buffer, format='JPEG', quality=80)
+            img.save(output_buffer, format='JPEG', quality=FACE_JPEG_QUALITY, optimize=False)
             image_bytes = output_buffer.getvalue()
+            _logger.info(f"Hikvision: JPEG hajmi - {len(image_bytes)} bytes, o'lcham - {img.size}")
             
         except Exception as e:
-            raise Exception(f"Rasm konvertatsiya xatosi: {str(e)}")
+            raise HikvisionImageError(f"Rasm konvertatsiya xatosi: {str(e)}")
         
-        # Multipart body yaratish
-        boundary = "----HikvisionBoundaryABC123"
+        return image_bytes
+    
+    def _get_face_json(self, employee):
+        """
+        Yuz rasmi uchun FDLib va Access Control JSON qismlarini yaratish.
         
-        # FDLib uchun JSON
+        Returns:
+            tuple: (face_info_fdlib, face_info_ac)
+        """
+        # FDLib uchun JSON - Hikvision dokumentatsiyasiga ko'ra barcha fieldlar kerak
         face_info_fdlib = {
             "faceLibType": "blackFD",
             "FDID": "1",
             "FPID": str(employee.barcode),
             "name": employee.name,
-            "gender": "male"
+            "gender": "male"  # Majburiy field - Hikvision dokumentatsiyasidan
         }
         
         # Access Control uchun JSON
@@ -368,23 +581,62 @@ class HikvisionSyncMixin(models.AbstractModel):
                 "faceDataURL": ""
             }
         }
+        return face_info_fdlib, face_info_ac
+    
+    def _build_face_multipart(self, face_json, image_bytes, img_field='img'):
+        """
+        Yuz rasmi uchun multipart body yaratish.
         
-        def build_multipart_body(face_json, img_field_name="img"):
-            body = b''
-            body += f'--{boundary}\r\n'.encode('utf-8')
-            body += b'Content-Disposition: form-data; name="FaceDataRecord"\r\n'
-            body += b'Content-Type: application/json\r\n\r\n'
-            body += json.dumps(face_json).encode('utf-8')
-            body += b'\r\n'
-            body += f'--{boundary}\r\n'.encode('utf-8')
-            body += f'Content-Disposition: form-data; name="{img_field_name}"; filename="face.jpg"\r\n'.encode('utf-8')
-            body += b'Content-Type: image/jpeg\r\n\r\n'
-            body += image_bytes
-            body += b'\r\n'
-            body += f'--{boundary}--\r\n'.encode('utf-8')
-            return body
-        
-        content_type = f'multipart/form-data; boundary={boundary}'
+        Body bitta bytes'ga birlashtirilmaydi - rasm xotirada ikki marta saqlanmasligi uchun
+        qismlar _MultipartStream orqali to'g'ridan-to'g'ri socketga yoziladi.
+        Har bir so'rov uchun yangi body yaratilishi kerak.
+        
+        Returns:
+            tuple: (body, content_type)
+        """
+        body = _MultipartStream([
+            _MP_PART1,
+            _dumps(face_json),
+            _MP_IMG_HDR % img_field.encode('utf-8'),
+            image_bytes,
+            _MP_TAIL,
+        ])
+        return body, _MP_CONTENT_TYPE
+    
+    def _order_face_configs(self, configs):
+        """Qurilmada oldin ishlagan yuz yuklash endpointini ro'yxat boshiga qo'yish."""
+        preferred = self.preferred_face_endpoint
+        if preferred:
+            configs.sort(key=lambda config: config['endpoint'] != preferred)
+        return configs
+    
+    def _remember_face_endpoint(self, endpoint):
+        """
+        Ishlagan yuz yuklash endpointini qurilmada saqlash.
+        
+        Alohida qisqa cursor ishlatiladi - background sync cursor'i qurilma
+        qatorini bloklab qo'ymasligi uchun.
+        """
+        if self.preferred_face_endpoint == endpoint:
+            return
+        with self.env.registry.cursor() as pref_cr:
+            pref_cr.execute(
+                "UPDATE hikvision_device SET preferred_face_endpoint = %s WHERE id = %s",
+                (endpoint, self.id)
+            )
+        self.invalidate_recordset(['preferred_face_endpoint'])
+    
+    def _upload_face_data_new(self, employee):
+        """
+        Yangi xodim yuz rasmini Hikvision qurilmasiga yuklash.
+        
+        Faqat POST (yaratish) ishlatadi - DELETE va PUT o'tkazib yuboriladi.
+        Bu har bir xodim uchun 40-60 sekund tejaydi.
+        """
+        _logger.info(f"Hikvision: Yangi yuz rasmi yuklash - {employee.name}")
+        
+        image_bytes = self._prepare_face_jpeg(employee.image_1920)
+        face_info_fdlib, face_info_ac = self._get_face_json(employee)
         
         # Faqat yaratish endpointlarini sinash (PUT/Modify o'tkazib yuboriladi)
         configs_to_try = [
@@ -404,14 +656,20 @@ class HikvisionSyncMixin(models.AbstractModel):
             },
         ]
         
+        # Oldin ishlagan endpoint birinchi sinaladi
+        self._order_face_configs(configs_to_try)
+        
         last_error = None
         for config in configs_to_try:
             try:
-                body = build_multipart_body(config['face_json'], config['img_field'])
-                response = self._make_request_multipart('POST', config['endpoint'], data=body, content_type=content_type)
+                body, content_type = self._build_face_multipart(config['face_json'], image_bytes, config['img_field'])
+                self._make_request_multipart('POST', config['endpoint'], data=body, content_type=content_type)
                 _logger.info(f"Hikvision: Yuz rasmi yuklandi - {employee.name} ({config['description']})")
+                self._remember_face_endpoint(config['endpoint'])
                 return
                 
+            except HikvisionConnectionError:
+                raise
             except Exception as e:
                 last_error = str(e)
                 _logger.warning(f"Hikvision: {config['description']} ishlamadi - {last_error}")
@@ -426,37 +684,63 @@ class HikvisionSyncMixin(models.AbstractModel):
         Avval PUT (Modify) bilan yangilashga harakat qiladi,
         ishlamasa POST (Record) bilan yaratadi.
         """
-        user_data = {
-            "UserInfo": {
-                "employeeNo": employee.barcode,
-                "name": employee.name,
-                "userType": "normal",
-                "Valid": {
-                    "enable": True,
-                    "beginTime": "2020-01-01T00:00:00",
-                    "endTime": "2030-12-31T23:59:59",
-                    "timeType": "local"
-                },
-                "doorRight": "1",
-                "RightPlan": [{
-                    "doorNo": 1,
-                    "planTemplateNo": "1"
-                }]
-            }
-        }
+        user_data = self._build_user_info_body(employee)
         
         # Avval PUT (Modify) bilan yangilashga harakat qilamiz
         try:
-            self._make_request('PUT', 'AccessControl/UserInfo/Modify?format=json', data=json.dumps(user_data))
+            self._make_request('PUT', 'AccessControl/UserInfo/Modify?format=json', data=user_data)
             _logger.info(f"Hikvision: {employee.name} - ma'lumotlar yangilandi (Modify)")
             return
+        except HikvisionConnectionError:
+            raise
         except Exception as e:
             _logger.warning(f"Hikvision: Modify ishlamadi, Record sinab ko'rilmoqda - {str(e)}")
         
         # Modify ishlamasa, POST (Record) bilan yaratamiz
-        self._make_request('POST', 'AccessControl/UserInfo/Record?format=json', data=json.dumps(user_data))
+        self._make_request('POST', 'AccessControl/UserInfo/Record?format=json', data=user_data)
         _logger.info(f"Hikvision: {employee.name} - ma'lumotlar yaratildi (Record)")
     
+    def _upload_users_bulk(self, employees):
+        """
+        Bir nechta xodim ma'lumotlarini qurilmaga bitta HTTP sessiya orqali yuklash.
+        
+        Returns:
+            dict: {employee_id: xato matni} - faqat xato bo'lgan xodimlar
+        """
+        self.ensure_one()
+        errors = {}
+        for index, employee in enumerate(employees):
+            try:
+                self._upload_user_info(employee)
+            except HikvisionConnectionError as e:
+                # Qurilma javob bermayapti - qolgan xodimlar uchun timeout kutilmaydi
+                errors.update(dict.fromkeys(employees[index:].ids, str(e)))
+                break
+            except Exception as e:
+                errors[employee.id] = str(e)
+        return errors
+    
+    def _upload_faces_bulk(self, employees):
+        """
+        Bir nechta xodim yuz rasmini qurilmaga bitta HTTP sessiya orqali yuklash.
+        
+        Returns:
+            dict: {employee_id: exception} - faqat xato bo'lgan xodimlar
+            (HikvisionImageError rasm muammosini boshqa xatolardan ajratadi)
+        """
+        self.ensure_one()
+        errors = {}
+        for index, employee in enumerate(employees):
+            try:
+                self._upload_face_data(employee)
+            except HikvisionConnectionError as e:
+                # Qurilma javob bermayapti - qolgan xodimlar uchun timeout kutilmaydi
+                errors.update(dict.fromkeys(employees[index:].ids, e))
+                break
+            except Exception as e:
+                errors[employee.id] = e
+        return errors
+    
     def _delete_face_data(self, employee):
         """
         Xodim yuz rasmini Hikvision qurilmasidan o'chirish.
@@ -489,9 +773,11 @@ class HikvisionSyncMixin(models.AbstractModel):
         for config in delete_configs:
             try:
                 _logger.info(f"Hikvision: Yuz o'chirish sinayapti - {config['endpoint']}")
-                self._make_request('PUT', config['endpoint'], data=json.dumps(config['data']))
+                self._make_request('PUT', config['endpoint'], data=_dumps(config['data']))
                 _logger.info(f"Hikvision: Eski yuz rasmi o'chirildi - {employee.name} (barcode: {employee_no})")
                 return
+            except HikvisionConnectionError:
+                raise
             except Exception as e:
                 _logger.warning(f"Hikvision: {config['endpoint']} ishlamadi - {str(e)}")
                 continue
@@ -521,7 +807,7 @@ class HikvisionSyncMixin(models.AbstractModel):
         
         for config in face_delete_configs:
             try:
-                self._make_request('PUT', config['endpoint'], data=json.dumps(config['data']))
+                self._make_request('PUT', config['endpoint'], data=_dumps(config['data']))
                 _logger.info(f"Hikvision: Yuz rasmi o'chirildi - barcode: {employee_no}")
                 break
             except Exception as e:
@@ -539,7 +825,7 @@ class HikvisionSyncMixin(models.AbstractModel):
         
         try:
             self._make_request('PUT', 'AccessControl/UserInfo/Delete?format=json', 
-                              data=json.dumps(user_delete_data))
+                              data=_dumps(user_delete_data))
             _logger.info(f"Hikvision: Foydalanuvchi o'chirildi - barcode: {employee_no}")
         except Exception as e:
             _logger.error(f"Hikvision: Foydalanuvchi o'chirishda xato - {str(e)}")
@@ -552,91 +838,14 @@ class HikvisionSyncMixin(models.AbstractModel):
         - Yangilash: PUT /ISAPI/Intelligent/FDLib/FDModify?format=json
         - Yaratish: POST /ISAPI/Intelligent/FDLib/FaceDataRecord?format=json
         """
-        import io
-        from PIL import Image
-        
         _logger.info(f"Hikvision: Yuz rasmini yuklash boshlanmoqda - {employee.name} (barcode: {employee.barcode})")
         
         # MUHIM: Avval eski rasmni o'chirishga harakat qilamiz
         # Bu FDModify ishlamasa ham rasmni yangilashni ta'minlaydi
         self._delete_face_data(employee)
         
-        image_data = employee.image_1920
-        
-        if not image_data:
-            raise Exception(f"Xodimda rasm mavjud emas")
-        
-        # Base64 string ni olish
-        if isinstance(image_data, bytes):
-            image_base64 = image_data.decode('utf-8')
-        else:
-            image_base64 = image_data
-        
-        # Rasmni decode qilish
-        try:
-            image_bytes = base64.b64decode(image_base64)
-        except Exception as e:
-            raise Exception(f"Base64 decode xatosi: {str(e)}")
-        
-        # Rasmni JPEG formatga convert qilish
-        try:
-            img = Image.open(io.BytesIO(image_bytes))
-            
-            if img.mode in ('RGBA', 'P'):
-                img = img.convert('RGB')
-            elif img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            max_size = (640, 480)
-            if img.size[0] > max_size[0] or img.size[1] > max_size[1]:
-                img.thumbnail(max_size, Image.Resampling.LANCZOS)
-            
-            output_buffer = io.BytesIO()
-            img.save(output_buffer, format='JPEG', quality=80)
-            image_bytes = output_buffer.getvalue()
-            _logger.info(f"Hikvision: JPEG hajmi - {len(image_bytes)} bytes, o'lcham - {img.size}")
-            
-        except Exception as e:
-            _logger.warning(f"Hikvision: Rasm formati noto'g'ri - {employee.name}")
-            raise Exception(f"Rasm formati noto'g'ri yoki buzilgan")
-        
-        # Multipart body yaratish
-        boundary = "----HikvisionBoundaryABC123"
-        
-        # FDLib uchun JSON (yangilash va yaratish uchun)
-        # Hikvision dokumentatsiyasiga ko'ra barcha fieldlar kerak
-        face_info_fdlib = {
-            "faceLibType": "blackFD",
-            "FDID": "1",
-            "FPID": str(employee.barcode),
-            "name": employee.name,
-            "gender": "male"  # Majburiy field - Hikvision dokumentatsiyasidan
-        }
-        
-        # Access Control uchun JSON
-        face_info_ac = {
-            "FaceInfo": {
-                "employeeNo": str(employee.barcode),
-                "faceDataURL": ""
-            }
-        }
-        
-        def build_multipart_body(face_json, img_field_name="img"):
-            body = b''
-            body += f'--{boundary}\r\n'.encode('utf-8')
-            body += b'Content-Disposition: form-data; name="FaceDataRecord"\r\n'
-            body += b'Content-Type: application/json\r\n\r\n'
-            body += json.dumps(face_json).encode('utf-8')
-            body += b'\r\n'
-            body += f'--{boundary}\r\n'.encode('utf-8')
-            body += f'Content-Disposition: form-data; name="{img_field_name}"; filename="face.jpg"\r\n'.encode('utf-8')
-            body += b'Content-Type: image/jpeg\r\n\r\n'
-            body += image_bytes
-            body += b'\r\n'
-            body += f'--{boundary}--\r\n'.encode('utf-8')
-            return body
-        
-        content_type = f'multipart/form-data; boundary={boundary}'
+        image_bytes = self._prepare_face_jpeg(employee.image_1920)
+        face_info_fdlib, face_info_ac = self._get_face_json(employee)
         
         # Endpointlar ro'yxati - birinchi yangilash (PUT), keyin yaratish (POST)
         configs_to_try = [
@@ -666,10 +875,13 @@ class HikvisionSyncMixin(models.AbstractModel):
             },
         ]
         
+        # Oldin ishlagan endpoint birinchi sinaladi
+        self._order_face_configs(configs_to_try)
+        
         last_error = None
         for config in configs_to_try:
             try:
-                body = build_multipart_body(config['face_json'], config['img_field'])
+                body, content_type = self._build_face_multipart(config['face_json'], image_bytes, config['img_field'])
                 _logger.info(f"Hikvision: Sinayapti - {config['description']} ({config['method']} {config['endpoint']})")
                 
                 # PUT yoki POST ga qarab so'rov yuborish
@@ -685,8 +897,11 @@ class HikvisionSyncMixin(models.AbstractModel):
                     pass
                 
                 _logger.info(f"Hikvision: Yuz rasmi muvaffaqiyatli yuklandi - {employee.name} ({config['description']})")
+                self._remember_face_endpoint(config['endpoint'])
                 return
                 
+            except HikvisionConnectionError:
+                raise
             except Exception as e:
                 last_error = str(e)
                 _logger.warning(f"Hikvision: {config['description']} ishlamadi - {last_error}")
@@ -707,7 +922,9 @@ class HikvisionSyncMixin(models.AbstractModel):
         }
         
         try:
-            self._make_request('PUT', 'AccessControl/UserInfo/Delete?format=json', data=json.dumps(delete_data))
+            self._make_request('PUT', 'AccessControl/UserInfo/Delete?format=json', data=_dumps(delete_data))
+            # Qurilma bo'sh - keyingi sinxronlashda hamma qayta yuklanishi kerak
+            self.env['hikvision.employee.sync.state'].sudo().search([('device_id', '=', self.id)]).unlink()
             return self._notify('Muvaffaqiyatli', "Qurilmadagi barcha foydalanuvchilar o'chirildi.")
         except Exception as e:
             return self._notify('Xato', str(e), 'danger', sticky=True)
@@ -726,8 +943,8 @@ class HikvisionSyncMixin(models.AbstractModel):
         
         try:
             response = self._make_request('POST', 'AccessControl/UserInfo/Search?format=json', 
-                                         data=json.dumps(search_data))
-            data = response.json()
+                                         data=_dumps(search_data))
+            data = _loads(response.content)
             total = data.get('UserInfoSearch', {}).get('totalMatches', 0)
             
             return self._notify("Qurilma ma'lumotlari", f'Qurilmada {total} ta foydalanuvchi mavjud.', 'info')
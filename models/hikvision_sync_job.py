@@ -0,0 +1,522 @@
+# -*- coding: utf-8 -*-
+"""
+Hikvision Sync Job Queue
+
+Xodim va ta'til o'zgarishlarini Hikvision qurilmalariga yuborish navbati.
+
+Foydalanuvchi so'rovi (create/write/unlink, ta'til tasdiqlash) faqat
+navbatga yozuv qo'shadi - HTTP so'rovlar cron worker tomonidan bajariladi.
+"""
+
+import json
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from odoo import models, fields, api, tools
+from odoo.exceptions import UserError
+from odoo.modules.registry import Registry
+
+from .hikvision_sync import HikvisionImageError
+
+# Bitta job necha marta qayta urinib ko'riladi
+MAX_RETRIES = 3
+# Xato bergan job qayta urinishidan oldingi kutish (har urinishda ikki baravar oshadi)
+RETRY_BASE_DELAY = timedelta(minutes=2)
+# Cron bir ishga tushishda olib bajaradigan job'lar soni
+JOB_BATCH_SIZE = 100
+# Bir vaqtda parallel ishlanadigan qurilmalar soni
+MAX_DEVICE_WORKERS = 8
+# Bitta qurilma uchun navbatda turishi mumkin bo'lgan job'lar soni (ir.config_parameter)
+DEFAULT_MAX_PENDING_PER_DEVICE = 500
+# Worker'ning bitta qurilmaga sekundiga yuboradigan so'rovlari soni (ir.config_parameter)
+DEFAULT_MAX_REQUESTS_PER_SECOND = 5
+
+# Ketma-ket kelganda bulk bajariladigan amallar va device metodlari
+BULK_OP_METHODS = {
+    'upload_user': '_upload_users_bulk',
+    'upload_face': '_upload_faces_bulk',
+    'disable_user': '_disable_users_bulk',
+    'enable_user': '_enable_users_bulk',
+}
+
+# Foydalanuvchiga natija xabari yuboriladigan amallar
+NOTIFY_OP_TYPES = ('upload_user', 'upload_face', 'delete_face', 'delete_user')
+# Xabarda ko'rsatiladigan amal nomlari
+OP_SYNC_LABELS = {
+    'upload_user': "ma'lumotlar",
+    'upload_face': "rasm",
+    'delete_face': "rasm o'chirildi",
+}
+
+# Yangi amal navbatga qo'yilganda eskirib qoladigan (bajarilmagan) amallar
+SUPERSEDED_OP_TYPES = {
+    'upload_face': ('delete_face',),
+    'delete_face': ('upload_face',),
+    'disable_user': ('enable_user',),
+    'enable_user': ('disable_user',),
+    'delete_user': ('upload_user', 'upload_face', 'delete_face', 'disable_user', 'enable_user'),
+}
+
+_logger = logging.getLogger(__name__)
+
+
+def _run_device_jobs(db_name, user_id, device_id, job_specs, rate_limit):
+    """
+    Bitta qurilmaning job'larini alohida thread'da bajarish.
+
+    Thread'lar umumiy cursor'ni ishlata olmaydi - har biri o'z cursor'ini ochadi.
+    Job natijalari bu yerda yozilmaydi (job qatorlari worker tranzaksiyasida band),
+    faqat qaytariladi.
+
+    Returns:
+        dict: {job_id: xato matni yoki None}
+    """
+    with Registry(db_name).cursor() as cr:
+        env = api.Environment(cr, user_id, {'hikvision_rate_limit': rate_limit})
+        return env['hikvision.sync.job']._execute_device_jobs(device_id, job_specs)
+
+
+class HikvisionSyncJob(models.Model):
+    """Qurilmaga yuborilishi kerak bo'lgan bitta amal (xodim x qurilma)"""
+
+    _name = 'hikvision.sync.job'
+    _description = 'Hikvision Sync Job'
+    _order = 'id'
+
+    employee_id = fields.Many2one('hr.employee', string='Employee', ondelete='set null', index=True)
+    device_id = fields.Many2one('hikvision.device', string='Device', required=True,
+                                ondelete='cascade', index=True)
+    op_type = fields.Selection([
+        ('upload_user', "Ma'lumotlarni yuklash"),
+        ('upload_face', 'Rasmni yuklash'),
+        ('delete_face', "Rasmni o'chirish"),
+        ('delete_user', "Qurilmadan o'chirish"),
+        ('disable_user', 'Bloklash'),
+        ('enable_user', 'Blokdan chiqarish'),
+    ], string='Amal', required=True)
+    # Navbatga qo'yilgan paytdagi xodim ma'lumotlari (barcode, name)
+    payload = fields.Json(string='Payload')
+    state = fields.Selection([
+        ('pending', 'Kutilmoqda'),
+        ('done', 'Bajarildi'),
+        ('failed', 'Xato'),
+    ], string='Status', default='pending', required=True, index=True)
+    retries = fields.Integer(string='Urinishlar', default=0)
+    # Xatodan keyin job shu vaqtgacha worker tomonidan olinmaydi (backoff)
+    next_attempt = fields.Datetime(string='Keyingi urinish')
+    error = fields.Text(string='Xato')
+    error_type = fields.Selection([
+        ('image', 'Rasm'),
+        ('error', 'Xato'),
+    ], string='Xato turi')
+
+    def init(self):
+        # Enqueue'da (xodim, qurilma, amal) bo'yicha kutilayotgan job'ni tez topish uchun
+        tools.create_index(
+            self._cr, 'hikvision_sync_job_pending_key_index', self._table,
+            ['employee_id', 'device_id', 'op_type'], where="state = 'pending'",
+        )
+
+    # =====================================================
+    # ENQUEUE
+    # =====================================================
+
+    @api.model
+    def _enqueue(self, devices, employees, op_type):
+        """
+        Har bir (xodim, qurilma) juftligi uchun job yaratish va worker'ni uyg'otish.
+
+        Bir xil (xodim, qurilma, amal) uchun kutilayotgan job bo'lsa, yangi yozuv
+        qo'shilmaydi - mavjud job payload'i yangilanadi. Yangi amal tufayli eskirgan
+        job'lar (masalan rasm yuklash -> rasm o'chirish) navbatdan olib tashlanadi.
+        Worker band qilgan job'larga tegilmaydi (SKIP LOCKED) - so'rov kutib qolmaydi.
+
+        Args:
+            devices: hikvision.device recordset
+            employees: hr.employee recordset
+            op_type: Amal turi (op_type selection qiymati)
+
+        Returns:
+            hikvision.sync.job recordset (yaratilgan va yangilangan)
+        """
+        if not devices or not employees:
+            return self.browse()
+
+        self.flush_model()
+        cr = self.env.cr
+
+        superseded = SUPERSEDED_OP_TYPES.get(op_type)
+        if superseded:
+            cr.execute("""
+                DELETE FROM hikvision_sync_job
+                WHERE id IN (
+                    SELECT id FROM hikvision_sync_job
+                    WHERE state = 'pending'
+                      AND op_type IN %s
+                      AND employee_id = ANY(%s)
+                      AND device_id = ANY(%s)
+                    FOR UPDATE SKIP LOCKED
+                )
+            """, (superseded, employees.ids, devices.ids))
+
+        payloads = {
+            employee.id: {'barcode': employee.barcode, 'name': employee.name}
+            for employee in employees
+        }
+
+        # Kutilayotgan job'larni yangilash (coalesce)
+        cr.execute("""
+            UPDATE hikvision_sync_job AS job
+            SET payload = data.payload, retries = 0, error = NULL, next_attempt = NULL,
+                write_uid = %s, write_date = (now() at time zone 'UTC')
+            FROM (
+                SELECT unnest(%s::int[]) AS employee_id, unnest(%s::jsonb[]) AS payload
+            ) AS data
+            WHERE job.employee_id = data.employee_id
+              AND job.id IN (
+                  SELECT id FROM hikvision_sync_job
+                  WHERE state = 'pending'
+                    AND op_type = %s
+                    AND employee_id = ANY(%s)
+                    AND device_id = ANY(%s)
+                  FOR UPDATE SKIP LOCKED
+              )
+            RETURNING job.id, job.employee_id, job.device_id
+        """, (
+            self.env.uid,
+            list(payloads), [json.dumps(payload) for payload in payloads.values()],
+            op_type, employees.ids, devices.ids,
+        ))
+        updated = cr.fetchall()
+        self.invalidate_model()
+
+        existing_pairs = {(employee_id, device_id) for _job_id, employee_id, device_id in updated}
+        vals_list = [{
+            'employee_id': employee.id,
+            'device_id': device.id,
+            'op_type': op_type,
+            'payload': payloads[employee.id],
+        } for employee in employees for device in devices
+            if (employee.id, device.id) not in existing_pairs]
+
+        if vals_list:
+            self._check_pending_capacity(vals_list)
+
+        jobs = self.sudo().browse([row[0] for row in updated])
+        if vals_list:
+            jobs |= self.sudo().create(vals_list)
+            self._trigger_worker()
+        return jobs
+
+    @api.model
+    def _check_pending_capacity(self, vals_list):
+        """
+        Qurilma navbati to'lib qolmasligini tekshirish (backpressure).
+
+        Navbatdagi job'lar soni hikvision.max_pending_per_device dan oshsa
+        UserError - foydalanuvchi navbat bo'shagach qayta urinadi.
+        """
+        max_pending = int(self.env['ir.config_parameter'].sudo().get_param(
+            'hikvision.max_pending_per_device', DEFAULT_MAX_PENDING_PER_DEVICE))
+
+        new_counts = defaultdict(int)
+        for vals in vals_list:
+            new_counts[vals['device_id']] += 1
+
+        self.env.cr.execute("""
+            SELECT device_id, count(*) FROM hikvision_sync_job
+            WHERE state = 'pending' AND device_id = ANY(%s)
+            GROUP BY device_id
+        """, (list(new_counts),))
+        pending_counts = dict(self.env.cr.fetchall())
+
+        for device_id, new_count in new_counts.items():
+            if pending_counts.get(device_id, 0) + new_count > max_pending:
+                device = self.env['hikvision.device'].browse(device_id)
+                raise UserError(
+                    f"Hikvision qurilmasi navbati to'lgan ({device.name}: "
+                    f"{pending_counts.get(device_id, 0)} ta job kutilmoqda, limit {max_pending}). "
+                    "Navbat bo'shagach qayta urinib ko'ring."
+                )
+
+    @api.model
+    def _trigger_worker(self, at=None):
+        """Cron worker'ni navbatdagi intervalni kutmasdan (yoki at vaqtida) ishga tushirish."""
+        cron = self.env.ref(f'{self._module}.ir_cron_process_hikvision_sync_jobs', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger(at=at)
+
+    # =====================================================
+    # WORKER
+    # =====================================================
+
+    @api.model
+    def _cron_process_jobs(self, limit=JOB_BATCH_SIZE):
+        """
+        Navbatdagi job'larni bajarish.
+
+        FOR UPDATE SKIP LOCKED - bir vaqtda ishlayotgan boshqa worker
+        band qilgan job'lar o'tkazib yuboriladi. Xato bergan job'lar
+        next_attempt vaqti kelguncha olinmaydi.
+        """
+        self.env.cr.execute("""
+            SELECT id FROM hikvision_sync_job
+            WHERE state = 'pending'
+              AND (next_attempt IS NULL OR next_attempt <= (now() at time zone 'UTC'))
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (limit,))
+        jobs = self.browse([row[0] for row in self.env.cr.fetchall()])
+
+        if not jobs:
+            return
+
+        _logger.info(f"Hikvision: Sync navbati - {len(jobs)} ta job bajarilmoqda")
+
+        specs_by_device = defaultdict(list)
+        for job in jobs:
+            specs_by_device[job.device_id.id].append(
+                (job.id, job.op_type, job.employee_id.id, job.payload or {})
+            )
+
+        # Har bir qurilma alohida thread'da - umumiy vaqt eng sekin qurilmaga teng
+        results = {}
+        db_name = self.env.cr.dbname
+        user_id = self.env.uid
+        rate_limit = float(self.env['ir.config_parameter'].sudo().get_param(
+            'hikvision.max_requests_per_second', DEFAULT_MAX_REQUESTS_PER_SECOND))
+        with ThreadPoolExecutor(max_workers=min(MAX_DEVICE_WORKERS, len(specs_by_device))) as executor:
+            futures = {
+                executor.submit(_run_device_jobs, db_name, user_id, device_id, job_specs, rate_limit): device_id
+                for device_id, job_specs in specs_by_device.items()
+            }
+            for future in as_completed(futures):
+                device_id = futures[future]
+                try:
+                    results.update(future.result())
+                except Exception as e:
+                    _logger.error(f"Hikvision: Qurilma {device_id} job'larini bajarishda xato: {str(e)}")
+                    results.update(dict.fromkeys(
+                        (spec[0] for spec in specs_by_device[device_id]), str(e)
+                    ))
+
+        for job in jobs:
+            job._set_result(results.get(job.id))
+
+        jobs._send_result_notifications()
+        self._trigger_pending()
+
+    @api.model
+    def _trigger_pending(self):
+        """
+        Navbatda qolgan job'lar uchun worker'ni rejalashtirish.
+
+        Hali urinilmagan (yoki kutish vaqti o'tgan) job bo'lsa - darhol keyingi batch,
+        faqat qayta urinishni kutayotganlar bo'lsa - eng yaqin next_attempt vaqtida.
+        """
+        self.flush_model(['state', 'next_attempt'])
+        self.env.cr.execute("""
+            SELECT bool_or(next_attempt IS NULL OR next_attempt <= (now() at time zone 'UTC')),
+                   min(next_attempt)
+            FROM hikvision_sync_job
+            WHERE state = 'pending'
+        """)
+        has_due, next_attempt = self.env.cr.fetchone()
+        if has_due:
+            self._trigger_worker()
+        elif next_attempt:
+            self._trigger_worker(at=next_attempt)
+
+    @api.model
+    def _execute_device_jobs(self, device_id, job_specs):
+        """
+        Bitta qurilma uchun job'larni bajarish (HTTP qismi).
+
+        Job'lar navbat (id) tartibida bajariladi - masalan delete_user'dan keyin
+        qo'yilgan upload_user undan keyin ishlaydi. Faqat ketma-ket kelgan bir
+        xil yuklash/bloklash job'lari bitta bulk so'rovga birlashtiriladi.
+
+        Args:
+            device_id: hikvision.device ID
+            job_specs: [(job_id, op_type, employee_id, payload), ...] - id tartibida
+
+        Returns:
+            dict: {job_id: xato matni yoki None}
+        """
+        device = self.env['hikvision.device'].browse(device_id)
+        Employee = self.env['hr.employee']
+        SyncState = self.env['hikvision.employee.sync.state'].sudo()
+        results = {}
+
+        for op_type, op_specs in groupby(job_specs, key=itemgetter(1)):
+            op_specs = list(op_specs)
+            method = BULK_OP_METHODS.get(op_type)
+
+            if method:
+                employees = Employee.browse([spec[2] for spec in op_specs if spec[2]]).exists()
+                # Qurilmadagi bilan bir xil ma'lumotlar qayta yuborilmaydi
+                to_send = SyncState._filter_unsynced(device, employees, op_type)
+                try:
+                    errors = getattr(device, method)(to_send)
+                except Exception as e:
+                    errors = dict.fromkeys(to_send.ids, str(e))
+                SyncState._record_synced(device, to_send.filtered(lambda e: e.id not in errors), op_type)
+
+                existing_ids = set(employees.ids)
+                for job_id, _op_type, employee_id, payload in op_specs:
+                    if employee_id not in existing_ids:
+                        results[job_id] = f"Xodim topilmadi: {payload.get('name')}"
+                    else:
+                        results[job_id] = errors.get(employee_id)
+                continue
+
+            for job_id, _op_type, employee_id, payload in op_specs:
+                employee = Employee.browse(employee_id)
+                try:
+                    if op_type == 'delete_user':
+                        device._delete_user_from_device(payload.get('barcode'))
+                        SyncState._clear_synced(device, employee.exists(), payload.get('barcode'))
+                    elif not employee.exists():
+                        raise Exception(f"Xodim topilmadi: {payload.get('name')}")
+                    elif op_type == 'delete_face':
+                        device._delete_face_data(employee)
+                        SyncState._record_synced(device, employee, op_type)
+                    results[job_id] = None
+                except Exception as e:
+                    results[job_id] = str(e)
+
+        return results
+
+    def _set_result(self, error=None):
+        """
+        Job natijasini yozish: xato bo'lmasa done, aks holda qayta urinish yoki failed.
+
+        Rasm xatosi (HikvisionImageError) qayta urinishda tuzalmaydi - job darhol failed.
+        Boshqa xatolarda job RETRY_BASE_DELAY * 2^(urinish-1) dan keyin qayta olinadi.
+        """
+        self.ensure_one()
+        name = (self.payload or {}).get('name')
+
+        if not error:
+            self.write({'state': 'done', 'error': False, 'error_type': False})
+            _logger.info(f"Hikvision: {name} - {self.op_type} bajarildi ({self.device_id.name})")
+            return
+
+        is_image_error = isinstance(error, HikvisionImageError)
+        retries = self.retries + 1
+        self.write({
+            'retries': retries,
+            'error': str(error),
+            'error_type': 'image' if is_image_error else 'error',
+            'state': 'failed' if is_image_error or retries >= MAX_RETRIES else 'pending',
+            # Qurilma o'chiq bo'lsa urinishlar ketma-ket tugab qolmasligi uchun
+            'next_attempt': fields.Datetime.now() + RETRY_BASE_DELAY * 2 ** (retries - 1),
+        })
+        _logger.error(f"Hikvision: {name} - {self.op_type} xatosi ({self.device_id.name}): {error}")
+
+    def _send_result_notifications(self):
+        """
+        Yakunlangan job'lar bo'yicha job yaratgan foydalanuvchiga xabar yuborish.
+
+        Xabarlar (foydalanuvchi, xodim) bo'yicha guruhlanadi - har bir xodim
+        uchun bitta muvaffaqiyat va bitta xato xabari.
+        """
+        notifications = []
+        groups = {}
+        for job in self:
+            if job.state not in ('done', 'failed') or job.op_type not in NOTIFY_OP_TYPES:
+                continue
+            name = (job.payload or {}).get('name') or job.employee_id.name
+            is_delete = job.op_type == 'delete_user'
+            group = groups.setdefault((job.create_uid.partner_id, name, is_delete), {
+                'success': [], 'failed': [], 'sync_type': [],
+            })
+            if job.state == 'done':
+                if job.device_id.name not in group['success']:
+                    group['success'].append(job.device_id.name)
+                label = OP_SYNC_LABELS.get(job.op_type)
+                if label and label not in group['sync_type']:
+                    group['sync_type'].append(label)
+            else:
+                group['failed'].append((f"{job.device_id.name}: {job.error}", job.error_type))
+
+        for (partner, name, is_delete), group in groups.items():
+            success_devices = group['success']
+            failed_devices = group['failed']
+
+            if is_delete:
+                if success_devices:
+                    notifications.append((partner, 'simple_notification', {
+                        'title': "Hikvision O'chirish",
+                        'message': f"🗑️ {name} Hikvision qurilmalaridan o'chirildi: {', '.join(success_devices)}",
+                        'type': 'warning',
+                        'sticky': False,
+                    }))
+                if failed_devices:
+                    notifications.append((partner, 'simple_notification', {
+                        'title': 'Hikvision Xatolik',
+                        'message': f"❌ {name} ba'zi qurilmalardan o'chirilmadi:\n" + "\n".join(
+                            message for message, _error_type in failed_devices),
+                        'type': 'danger',
+                        'sticky': True,
+                    }))
+                continue
+
+            if success_devices:
+                sync_desc = ", ".join(group['sync_type']) if group['sync_type'] else "ma'lumotlar"
+                notifications.append((partner, 'simple_notification', {
+                    'title': 'Hikvision Sinxronlash',
+                    'message': f"✅ {name} - {sync_desc} yangilandi: {', '.join(success_devices)}",
+                    'type': 'success',
+                    'sticky': False,
+                }))
+
+            if failed_devices:
+                # Rasm yo'qligini alohida ko'rsatish
+                image_warnings = [d for d, error_type in failed_devices if error_type == 'image']
+                real_errors = [d for d, error_type in failed_devices if error_type != 'image']
+
+                if real_errors:
+                    notifications.append((partner, 'simple_notification', {
+                        'title': 'Hikvision Xatolik',
+                        'message': f"⚠️ {name} sinxronlashda muammolar:\n" + "\n".join(real_errors),
+                        'type': 'danger',
+                        'sticky': True,
+                    }))
+
+                if image_warnings:
+                    # Rasm xatoliklari uchun yumshoqroq xabar
+                    notifications.append((partner, 'simple_notification', {
+                        'title': 'Hikvision Info',
+                        'message': f"ℹ️ {name}: Rasm yuklanmadi (rasm yo'q yoki format noto'g'ri)",
+                        'type': 'info',
+                        'sticky': False,
+                    }))
+
+        self._send_bus_notifications(notifications)
+
+    @api.model
+    def _send_bus_notifications(self, notifications):
+        """
+        Yig'ilgan xabarlarni yuborish.
+
+        Bir foydalanuvchiga boradigan bir xil turdagi (sarlavha, rang) xabarlar
+        bittaga birlashtiriladi - xodimlar soniga qarab emas, har bir foydalanuvchi
+        va xabar turi uchun bitta bus xabari.
+        """
+        merged = {}
+        for partner, notification_type, message in notifications:
+            key = (partner, notification_type, message['title'], message['type'])
+            if key in merged:
+                merged[key]['message'] += "\n" + message['message']
+                merged[key]['sticky'] = merged[key]['sticky'] or message['sticky']
+            else:
+                merged[key] = dict(message)
+
+        for (partner, notification_type, _title, _type), message in merged.items():
+            partner._bus_send(notification_type, message)
@@ -6,7 +6,7 @@ Ta'til tasdiqlanganda Hikvision qurilmasida xodimni avtomatik bloklash.
 """
 
 import logging
-from datetime import datetime
+from datetime import datetime, time, timedelta
 from odoo import models, fields, api
 
 _logger = logging.getLogger(__name__)
@@ -17,37 +17,49 @@ class HrLeave(models.Model):
     
     _inherit = 'hr.leave'
 
+    def _get_hikvision_blocking_leaves(self):
+        """
+        Bugun davom etayotgan, tasdiqlangan TO'LIQ KUNLIK ta'tillar.
+        
+        Yarim kunlik (half day) va soatlik ta'tillar bloklanmaydi.
+        """
+        today = fields.Date.today()
+        # date_from.date() <= today <= date_to.date() - datetime chegaralari bilan
+        day_start = datetime.combine(today, time.min)
+        return self.filtered_domain([
+            ('state', '=', 'validate'),
+            ('request_unit_half', '=', False),
+            ('request_unit_hours', '=', False),
+            ('date_from', '<', day_start + timedelta(days=1)),
+            ('date_to', '>=', day_start),
+        ])
+
     def action_validate(self):
         """
         Ta'til tasdiqlanganda Hikvision qurilmasida xodimni bloklash.
         
         Bu metod faqat bugun yoki kelajakda boshlanadigan ta'tillar uchun ishlaydi.
         Agar ta'til bugun boshlanayotgan bo'lsa, xodim darhol bloklanadi.
+        Barcha ta'tillar xodimlari bitta navbat yozuvi bilan qo'shiladi.
         """
         result = super().action_validate()
         
-        today = fields.Date.today()
+        # Bugun boshlanmaydigan (kelajakdagi) ta'tillar - qurilmalarga tegilmaydi
+        leaves = self._get_hikvision_blocking_leaves()
+        if not leaves:
+            return result
         
-        for leave in self:
-            # Faqat TO'LIQ KUNLIK, tasdiqlangan va bugun boshlanadigan ta'tillar
-            # Yarim kunlik (half day) va soatlik ta'tillar bloklanmaydi
-            is_full_day = not leave.request_unit_half and not leave.request_unit_hours
-            if leave.state == 'validate' and is_full_day and leave.date_from.date() <= today <= leave.date_to.date():
-                employee = leave.employee_id
-                
-                if not employee.barcode:
-                    _logger.warning(f"Hikvision: {employee.name} - barcode mavjud emas, o'tkazib yuborildi")
-                    continue
-                
-                # Barcha tasdiqlangan qurilmalarda xodimni bloklash
-                devices = self.env['hikvision.device'].search([('state', '=', 'confirmed')])
-                
-                for device in devices:
-                    try:
-                        device._disable_user_on_device(employee)
-                        _logger.info(f"Hikvision: {employee.name} - ta'til boshlandi, qurilmada bloklandi ({device.name})")
-                    except Exception as e:
-                        _logger.error(f"Hikvision: {employee.name} bloklashda xato ({device.name}): {str(e)}")
+        employees = leaves.employee_id
+        for employee in employees.filtered(lambda e: not e.barcode):
+            _logger.warning("Hikvision: %s - barcode mavjud emas, o'tkazib yuborildi", employee.name)
+        
+        to_block = employees.filtered('barcode')
+        if to_block:
+            # Barcha tasdiqlangan qurilmalarda xodimlarni bloklash (navbat orqali)
+            devices = self.env['hikvision.device']._get_active_devices(auto_sync_only=False)
+            self.env['hikvision.sync.job']._enqueue(devices, to_block, 'disable_user')
+            _logger.info("Hikvision: %s - ta'til boshlandi, bloklash navbatga qo'yildi",
+                         ', '.join(to_block.mapped('name')))
         
         return result
 
@@ -55,30 +67,22 @@ class HrLeave(models.Model):
         """
         Ta'til bekor qilinganda xodimni qayta yoqish.
         """
-        # Bekor qilishdan oldin xodimlarni eslab qolamiz
-        employees_to_enable = []
-        today = fields.Date.today()
-        
-        for leave in self:
-            # Faqat TO'LIQ KUNLIK ta'tillar uchun xodim yoqiladi
-            is_full_day = not leave.request_unit_half and not leave.request_unit_hours
-            if leave.state == 'validate' and is_full_day and leave.date_from.date() <= today <= leave.date_to.date():
-                employees_to_enable.append(leave.employee_id)
+        # Bekor qilishdan oldin xodimlarni eslab qolamiz - bir nechta ustma-ust
+        # ta'tili bekor qilingan xodim bir marta yoqiladi
+        employee_ids = set(self._get_hikvision_blocking_leaves().employee_id.ids)
         
         result = super().action_refuse()
+        if not employee_ids:
+            return result
         
-        # Xodimlarni qayta yoqish
-        devices = self.env['hikvision.device'].search([('state', '=', 'confirmed')])
+        employees_to_enable = self.env['hr.employee'].browse(employee_ids).filtered('barcode')
+        if not employees_to_enable:
+            return result
         
-        for employee in employees_to_enable:
-            if not employee.barcode:
-                continue
-                
-            for device in devices:
-                try:
-                    device._enable_user_on_device(employee)
-                    _logger.info(f"Hikvision: {employee.name} - ta'til bekor qilindi, qurilmada yoqildi ({device.name})")
-                except Exception as e:
-                    _logger.error(f"Hikvision: {employee.name} yoqishda xato ({device.name}): {str(e)}")
+        # Xodimlarni qayta yoqish
+        devices = self.env['hikvision.device']._get_active_devices(auto_sync_only=False)
+        self.env['hikvision.sync.job']._enqueue(devices, employees_to_enable, 'enable_user')
+        _logger.info("Hikvision: %s - ta'til bekor qilindi, yoqish navbatga qo'yildi",
+                     ', '.join(employees_to_enable.mapped('name')))
         
         return result
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+
+
+def migrate(cr, version):
+    """Remove duplicate daily reports before the UNIQUE(report_date) constraint is created.
+
+    get_today_dashboard() upserts with ON CONFLICT (report_date), which needs that
+    constraint. The oldest report of each date is kept; the lines of the removed
+    duplicates go with them (ON DELETE CASCADE).
+    """
+    if not version:
+        return
+    cr.execute("""
+        DELETE FROM hr_daily_report r
+        USING hr_daily_report keep
+        WHERE r.report_date = keep.report_date
+          AND r.id > keep.id
+    """)
@@ -2,3 +2,6 @@
 
 from . import hr_report
 from . import hr_report_settings
+from . import hr_attendance
+from . import hr_leave
+from . import hr_attendance_overtime_line
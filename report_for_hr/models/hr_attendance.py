@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, tools
+
+
+class HrAttendance(models.Model):
+    _inherit = 'hr.attendance'
+
+    def init(self):
+        # Daily report: check-ins of a day, grouped by employee
+        tools.create_index(
+            self._cr, 'hr_attendance_check_in_employee_index', self._table,
+            ['check_in', 'employee_id'],
+        )
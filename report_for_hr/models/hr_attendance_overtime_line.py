@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, tools
+
+
+class HrAttendanceOvertimeLine(models.Model):
+    _inherit = 'hr.attendance.overtime.line'
+
+    def init(self):
+        # Monthly report: approved overtime of employees within a date range
+        tools.create_index(
+            self._cr, 'hr_attendance_overtime_line_employee_date_status_index', self._table,
+            ['employee_id', 'date', 'status'],
+        )
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, tools
+
+
+class HrLeave(models.Model):
+    _inherit = 'hr.leave'
+
+    def init(self):
+        # Daily report: validated leaves overlapping a day
+        tools.create_index(
+            self._cr, 'hr_leave_validate_date_range_index', self._table,
+            ['date_from', 'date_to'], where="state = 'validate'",
+        )
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 from odoo import models, fields, api
+from odoo.tools import SQL
 from datetime import datetime, date
 
 
@@ -30,10 +31,10 @@ class HrDailyReport(models.Model):
     report_date = fields.Date(string='Sana', default=fields.Date.today, required=True)
     
     # Statistics - computed directly from data
-    total_employees = fields.Integer(string='Jami xodimlar', compute='_compute_live_statistics')
-    present_count = fields.Integer(string='Kelganlar', compute='_compute_live_statistics')
-    absent_count = fields.Integer(string='Kelmaganlar', compute='_compute_live_statistics')
-    on_leave_count = fields.Integer(string="Ta'tildagilar", compute='_compute_live_statistics')
+    total_employees = fields.Integer(string='Jami xodimlar', compute='_compute_day_data')
+    present_count = fields.Integer(string='Kelganlar', compute='_compute_day_data')
+    absent_count = fields.Integer(string='Kelmaganlar', compute='_compute_day_data')
+    on_leave_count = fields.Integer(string="Ta'tildagilar", compute='_compute_day_data')
     
     # Report lines (for backward compatibility)
     line_ids = fields.One2many('hr.daily.report.line', 'daily_report_id', string='Xodimlar')
@@ -41,15 +42,20 @@ class HrDailyReport(models.Model):
     # Computed employee lists for tabs - direct from attendance/leave data
     absent_employee_ids = fields.Many2many(
         'hr.employee', string='Kelmagan xodimlar',
-        compute='_compute_employee_lists'
+        compute='_compute_day_data'
     )
     leave_ids = fields.Many2many(
         'hr.leave', string="Ta'tillar",
-        compute='_compute_employee_lists'
+        compute='_compute_day_data'
     )
     present_employee_ids = fields.Many2many(
         'hr.employee', string='Kelgan xodimlar',
-        compute='_compute_employee_lists'
+        compute='_compute_day_data'
+    )
+
+    _report_date_uniq = models.Constraint(
+        'UNIQUE(report_date)',
+        "Bu sana uchun hisobot allaqachon mavjud.",
     )
 
     @api.depends('report_date')
@@ -57,117 +63,107 @@ class HrDailyReport(models.Model):
         for record in self:
             record.name = f"HR Hisoboti - {record.report_date}"
 
+    def _collect_day_sets(self, report_date):
+        """Collect employee and leave ids for the given date in one pass.
+
+        Returns a tuple (all_ids, present_ids, on_leave_ids, leave_ids):
+        active employee ids, employees who checked in, employees on a validated
+        leave, and the leave record ids. The id collections are already distinct.
+        """
+        all_employee_ids = self.env['hr.employee'].search([('active', '=', True)]).ids
+        present_ids, on_leave_ids, leave_ids = self._get_day_attendance_sets(report_date)
+        return all_employee_ids, present_ids, on_leave_ids, leave_ids
+
+    @api.model
+    def _get_leave_domain(self, report_date):
+        """Validated leaves covering the given date"""
+        return [
+            ('state', '=', 'validate'),
+            ('date_from', '<=', report_date),
+            ('date_to', '>=', report_date),
+        ]
+
+    @api.model
+    def _get_day_attendance_sets(self, report_date):
+        """Attendance and leave derived sets for the given date (grouped queries)"""
+        # Get leaves for this date in one grouped query: leave ids per employee
+        leave_groups = self.env['hr.leave']._read_group(
+            self._get_leave_domain(report_date), ['employee_id'], ['id:array_agg'],
+        )
+        leave_ids = tuple(leave_id for _employee, ids in leave_groups for leave_id in ids)
+        
+        # Get employees who checked in on this date
+        date_start = datetime.combine(report_date, datetime.min.time())
+        date_end = datetime.combine(report_date, datetime.max.time())
+        
+        attendance_groups = self.env['hr.attendance']._read_group([
+            ('check_in', '>=', date_start),
+            ('check_in', '<=', date_end),
+        ], ['employee_id'])
+        
+        return (
+            frozenset(employee.id for employee, in attendance_groups if employee),
+            frozenset(employee.id for employee, _ids in leave_groups if employee),
+            leave_ids,
+        )
+
+    def _get_absent_employee_ids(self, report_date):
+        """Active employees without a check-in on the given date (anti-join in PostgreSQL).
+
+        Both sides are built with _search(), so hr.employee and hr.attendance
+        record rules apply exactly as for total_employees and present_count.
+        """
+        date_start = datetime.combine(report_date, datetime.min.time())
+        date_end = datetime.combine(report_date, datetime.max.time())
+        
+        attendance_query = self.env['hr.attendance']._search([
+            ('check_in', '>=', date_start),
+            ('check_in', '<=', date_end),
+        ])
+        present_subquery = attendance_query.subselect(SQL.identifier(attendance_query.table, 'employee_id'))
+        return self.env['hr.employee'].search([
+            ('active', '=', True),
+            ('id', 'not in', present_subquery),
+        ]).ids
+
+    def _get_line_status(self, employee_id, present_ids, on_leave_ids):
+        """Daily report line status of one employee"""
+        if employee_id in on_leave_ids:
+            return 'leave'
+        if employee_id in present_ids:
+            return 'present'
+        return 'absent'
+
     @api.depends('report_date')
-    def _compute_live_statistics(self):
-        """Compute statistics directly from attendance and leave data"""
+    def _compute_day_data(self):
+        """Compute statistics and employee lists from one pass over attendance and leave data"""
         for record in self:
             report_date = record.report_date or date.today()
+            all_ids, present_ids, on_leave_ids, leave_ids = self._collect_day_sets(report_date)
             
-            # Get all active employees
-            all_employees = self.env['hr.employee'].search([('active', '=', True)])
-            record.total_employees = len(all_employees)
-            
-            # Get employees on leave for this date
-            leaves = self.env['hr.leave'].search([
-                ('state', '=', 'validate'),
-                ('date_from', '<=', report_date),
-                ('date_to', '>=', report_date),
-            ])
-            on_leave_employee_ids = leaves.mapped('employee_id').ids
-            record.on_leave_count = len(on_leave_employee_ids)
-            
-            # Get employees who checked in on this date
-            date_start = datetime.combine(report_date, datetime.min.time())
-            date_end = datetime.combine(report_date, datetime.max.time())
-            
-            attendances = self.env['hr.attendance'].search([
-                ('check_in', '>=', date_start),
-                ('check_in', '<=', date_end),
-            ])
-            present_employee_ids = attendances.mapped('employee_id').ids
-            record.present_count = len(set(present_employee_ids))
-            
+            record.total_employees = len(all_ids)
+            record.present_count = len(present_ids)
+            record.on_leave_count = len(on_leave_ids)
             # Absent = Total - Present (includes those on leave)
             record.absent_count = record.total_employees - record.present_count
-
-    @api.depends('report_date')
-    def _compute_employee_lists(self):
-        """Compute employee lists directly from attendance and leave data"""
-        for record in self:
-            report_date = record.report_date or date.today()
-            
-            # Get all active employees
-            all_employees = self.env['hr.employee'].search([('active', '=', True)])
-            all_employee_ids = set(all_employees.ids)
-            
-            # Get employees on leave for this date
-            leaves = self.env['hr.leave'].search([
-                ('state', '=', 'validate'),
-                ('date_from', '<=', report_date),
-                ('date_to', '>=', report_date),
-            ])
-            on_leave_employee_ids = set(leaves.mapped('employee_id').ids)
-            
-            # Get employees who checked in on this date
-            date_start = datetime.combine(report_date, datetime.min.time())
-            date_end = datetime.combine(report_date, datetime.max.time())
-            
-            attendances = self.env['hr.attendance'].search([
-                ('check_in', '>=', date_start),
-                ('check_in', '<=', date_end),
-            ])
-            present_employee_ids = set(attendances.mapped('employee_id').ids)
-            
-            # Absent = All - Present (includes those on leave)
-            absent_employee_ids = all_employee_ids - present_employee_ids
             
-            # Set computed fields
-            record.present_employee_ids = [(6, 0, list(present_employee_ids))]
-            record.leave_ids = [(6, 0, leaves.ids)]
-            record.absent_employee_ids = [(6, 0, list(absent_employee_ids))]
+            record.present_employee_ids = [(6, 0, list(present_ids))]
+            record.leave_ids = [(6, 0, list(leave_ids))]
+            record.absent_employee_ids = [(6, 0, self._get_absent_employee_ids(report_date))]
 
     @api.onchange('report_date')
     def _onchange_report_date(self):
         """Auto-refresh lines when date is changed"""
         if self.report_date:
-            # Clear existing lines first
-            self.line_ids = [(5, 0, 0)]
+            all_ids, present_ids, on_leave_ids, _leave_ids = self._collect_day_sets(self.report_date)
             
-            report_date = self.report_date
+            # Clear existing lines and add new ones in a single assignment
+            lines = [(5, 0, 0)] + [(0, 0, {
+                'employee_id': emp_id,
+                'status': self._get_line_status(emp_id, present_ids, on_leave_ids),
+            }) for emp_id in all_ids]
             
-            all_employees = self.env['hr.employee'].search([('active', '=', True)])
-            
-            leaves = self.env['hr.leave'].search([
-                ('state', '=', 'validate'),
-                ('date_from', '<=', report_date),
-                ('date_to', '>=', report_date),
-            ])
-            on_leave_employee_ids = leaves.mapped('employee_id').ids
-            
-            date_start = datetime.combine(report_date, datetime.min.time())
-            date_end = datetime.combine(report_date, datetime.max.time())
-            
-            attendances = self.env['hr.attendance'].search([
-                ('check_in', '>=', date_start),
-                ('check_in', '<=', date_end),
-            ])
-            present_employee_ids = attendances.mapped('employee_id').ids
-            
-            lines = []
-            for emp in all_employees:
-                if emp.id in on_leave_employee_ids:
-                    status = 'leave'
-                elif emp.id in present_employee_ids:
-                    status = 'present'
-                else:
-                    status = 'absent'
-                
-                lines.append((0, 0, {
-                    'employee_id': emp.id,
-                    'status': status,
-                }))
-            
-            self.line_ids = lines
+            self.update({'line_ids': lines})
 
     def _generate_report_lines_onchange(self):
         """Generate report lines for onchange (works with virtual records)"""
@@ -177,52 +173,56 @@ class HrDailyReport(models.Model):
         """Generate report lines for saved records"""
         self.ensure_one()
         report_date = self.report_date or date.today()
+        Line = self.env['hr.daily.report.line']
+        # Lines are inserted by SQL below - check the create right the ORM would
+        Line.check_access('create')
         
         self.line_ids.unlink()
         
-        all_employees = self.env['hr.employee'].search([('active', '=', True)])
-        
-        leaves = self.env['hr.leave'].search([
-            ('state', '=', 'validate'),
-            ('date_from', '<=', report_date),
-            ('date_to', '>=', report_date),
-        ])
-        on_leave_employee_ids = leaves.mapped('employee_id').ids
-        
-        date_start = datetime.combine(report_date, datetime.min.time())
-        date_end = datetime.combine(report_date, datetime.max.time())
+        all_ids, present_ids, on_leave_ids, _leave_ids = self._collect_day_sets(report_date)
         
-        attendances = self.env['hr.attendance'].search([
-            ('check_in', '>=', date_start),
-            ('check_in', '<=', date_end),
-        ])
-        present_employee_ids = attendances.mapped('employee_id').ids
+        statuses = [self._get_line_status(emp_id, present_ids, on_leave_ids) for emp_id in all_ids]
         
-        lines_vals = []
-        for emp in all_employees:
-            if emp.id in on_leave_employee_ids:
-                status = 'leave'
-            elif emp.id in present_employee_ids:
-                status = 'present'
-            else:
-                status = 'absent'
-            
-            lines_vals.append({
-                'daily_report_id': self.id,
-                'employee_id': emp.id,
-                'status': status,
-            })
-        
-        self.env['hr.daily.report.line'].create(lines_vals)
+        # One INSERT for all lines; stored related fields (department_id, job_id)
+        # are copied from hr_employee in the same statement instead of recomputed per row
+        self.env['hr.employee'].flush_model(['department_id', 'job_id'])
+        self.env.cr.execute("""
+            INSERT INTO hr_daily_report_line
+                (daily_report_id, employee_id, department_id, job_id, status,
+                 create_uid, write_uid, create_date, write_date)
+            SELECT %s, e.id, e.department_id, e.job_id, data.status,
+                   %s, %s, now() at time zone 'UTC', now() at time zone 'UTC'
+            FROM unnest(%s::int[], %s::varchar[]) AS data(employee_id, status)
+            JOIN hr_employee e ON e.id = data.employee_id
+            RETURNING id
+        """, (self.id, self.env.uid, self.env.uid, list(all_ids), statuses))
+        lines = Line.browse([row[0] for row in self.env.cr.fetchall()])
+        Line.invalidate_model()
+        self.invalidate_recordset(['line_ids'])
+        # Rows were inserted by SQL - notify fields depending on the lines
+        lines.modified(['daily_report_id', 'employee_id', 'department_id', 'job_id', 'status'])
 
     @api.model
     def get_today_dashboard(self):
         """Get or create today's dashboard record"""
         today = fields.Date.today()
-        dashboard = self.search([('report_date', '=', today)], limit=1)
-        if not dashboard:
-            dashboard = self.create({'report_date': today})
+        self.check_access('create')
+        
+        # Single upsert - concurrent openings cannot create two dashboards for one date
+        self.env.cr.execute("""
+            INSERT INTO hr_daily_report (report_date, create_uid, write_uid, create_date, write_date)
+            VALUES (%s, %s, %s, now() at time zone 'UTC', now() at time zone 'UTC')
+            ON CONFLICT (report_date) DO NOTHING
+            RETURNING id
+        """, (today, self.env.uid, self.env.uid))
+        row = self.env.cr.fetchone()
+        if row:
+            dashboard = self.browse(row[0])
+            # Row was inserted by SQL - compute the stored name
+            dashboard.modified(['report_date'])
             dashboard._generate_report_lines()
+        else:
+            dashboard = self.search([('report_date', '=', today)], limit=1)
         return {
             'type': 'ir.actions.act_window',
             'name': 'Bugungi Hisobot',
@@ -236,36 +236,14 @@ class HrDailyReport(models.Model):
         """Get employee IDs by status for the selected date"""
         report_date = self.report_date or date.today()
         
-        all_employees = self.env['hr.employee'].search([('active', '=', True)])
-        
-        # Get employees on leave
-        leaves = self.env['hr.leave'].search([
-            ('state', '=', 'validate'),
-            ('date_from', '<=', report_date),
-            ('date_to', '>=', report_date),
-        ])
-        on_leave_employee_ids = set(leaves.mapped('employee_id').ids)
-        
-        # Get employees who checked in
-        date_start = datetime.combine(report_date, datetime.min.time())
-        date_end = datetime.combine(report_date, datetime.max.time())
-        
-        attendances = self.env['hr.attendance'].search([
-            ('check_in', '>=', date_start),
-            ('check_in', '<=', date_end),
-        ])
-        present_employee_ids = set(attendances.mapped('employee_id').ids)
-        
         if status == 'all':
-            return all_employees.ids
-        elif status == 'present':
-            return list(present_employee_ids)
-        elif status == 'leave':
-            return list(on_leave_employee_ids)
+            return self.env['hr.employee'].search([('active', '=', True)]).ids
         elif status == 'absent':
             # Absent = All - Present (includes those on leave)
-            absent_ids = set(all_employees.ids) - present_employee_ids
-            return list(absent_ids)
+            return self._get_absent_employee_ids(report_date)
+        elif status in ('present', 'leave'):
+            present_ids, on_leave_ids, _leave_ids = self._get_day_attendance_sets(report_date)
+            return list(present_ids if status == 'present' else on_leave_ids)
         return []
 
     def action_view_all(self):
@@ -299,21 +277,13 @@ class HrDailyReport(models.Model):
     def action_view_on_leave(self):
         """Open on leave records with details"""
         self.ensure_one()
-        report_date = self.report_date
-        
-        # Get leave records for this date
-        leaves = self.env['hr.leave'].search([
-            ('state', '=', 'validate'),
-            ('date_from', '<=', report_date),
-            ('date_to', '>=', report_date),
-        ])
-        
+        # Same leaves as the leave_ids tab - the client runs the search itself
         return {
             'type': 'ir.actions.act_window',
             'name': "Ta'tildagi xodimlar",
             'res_model': 'hr.leave',
             'view_mode': 'list,form',
-            'domain': [('id', 'in', leaves.ids)],
+            'domain': self._get_leave_domain(self.report_date),
             'context': {'create': False},
             'target': 'current',
         }
@@ -372,27 +342,32 @@ class HrReportAnalysis(models.Model):
                 record.total_leave_days = 0.0
                 continue
                 
-            domain = []
-            if record.department_id:
-                domain.append(('department_id', '=', record.department_id.id))
-            
-            employees = record.employee_ids or self.env['hr.employee'].search(domain)
-            record.total_employees = len(employees)
+            if record.employee_ids:
+                employee_filter = record.employee_ids.ids
+                record.total_employees = len(record.employee_ids)
+            else:
+                domain = []
+                if record.department_id:
+                    domain.append(('department_id', '=', record.department_id.id))
+                record.total_employees = self.env['hr.employee'].search_count(domain)
+                # Subquery instead of an IN (...) list with every employee id
+                employee_filter = self.env['hr.employee']._search(domain)
             
-            attendances = self.env['hr.attendance'].search([
-                ('employee_id', 'in', employees.ids),
+            # Sums are computed inside PostgreSQL
+            [(worked_hours,)] = self.env['hr.attendance']._read_group([
+                ('employee_id', 'in', employee_filter),
                 ('check_in', '>=', record.date_from),
                 ('check_in', '<=', record.date_to),
-            ])
-            record.total_worked_hours = sum(attendances.mapped('worked_hours'))
+            ], [], ['worked_hours:sum'])
+            record.total_worked_hours = worked_hours or 0.0
             
-            leaves = self.env['hr.leave'].search([
-                ('employee_id', 'in', employees.ids),
+            [(leave_days,)] = self.env['hr.leave']._read_group([
+                ('employee_id', 'in', employee_filter),
                 ('date_from', '>=', record.date_from),
                 ('date_to', '<=', record.date_to),
                 ('state', '=', 'validate'),
-            ])
-            record.total_leave_days = sum(leaves.mapped('number_of_days'))
+            ], [], ['number_of_days:sum'])
+            record.total_leave_days = leave_days or 0.0
 
     def action_generate_report(self):
         self.ensure_one()
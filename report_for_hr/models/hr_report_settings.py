@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
+
+# Fields read by the cached _get_grace_minutes
+GRACE_CACHE_FIELDS = {'late_grace_minutes', 'early_leave_grace_minutes', 'company_id'}
 
 
 class HrReportSettings(models.Model):
@@ -38,11 +41,41 @@ class HrReportSettings(models.Model):
             })
         return settings
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return records
+
+    def write(self, vals):
+        result = super().write(vals)
+        if GRACE_CACHE_FIELDS & set(vals):
+            self.env.registry.clear_cache()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.env.registry.clear_cache()
+        return result
+
     @api.model
     def get_grace_minutes(self):
         """Return grace period settings as dict"""
-        settings = self.get_settings()
+        late, early = self._get_grace_minutes(self.env.company.id)
         return {
-            'late': settings.late_grace_minutes,
-            'early': settings.early_leave_grace_minutes,
+            'late': late,
+            'early': early,
         }
+
+    @api.model
+    @tools.ormcache('company_id')
+    def _get_grace_minutes(self, company_id):
+        """(late, early) grace minutes of a company, cached until settings change.
+
+        Read-only: a company without a settings record gets the field defaults
+        instead of having one created while the cache value is computed.
+        """
+        settings = self.sudo().search([('company_id', '=', company_id)], limit=1)
+        if not settings:
+            return 0, 0
+        return settings.late_grace_minutes, settings.early_leave_grace_minutes
@@ -2,9 +2,16 @@
 
 from odoo import models, fields, api
 from datetime import datetime, timedelta
+import functools
 import pytz
 
 
+@functools.lru_cache(maxsize=64)
+def _tz(name):
+    """Cached pytz timezone lookup"""
+    return pytz.timezone(name)
+
+
 class HrAttendanceWizard(models.TransientModel):
     _name = 'hr.attendance.wizard'
     _description = 'Attendance Creation Wizard'
@@ -46,10 +53,9 @@ class HrAttendanceWizard(models.TransientModel):
 
     def _get_user_timezone(self):
         """Get user's timezone or default to UTC"""
-        tz_name = self.env.user.tz or 'UTC'
-        return pytz.timezone(tz_name)
+        return _tz(self.env.user.tz or 'UTC')
 
-    def _float_to_utc_datetime(self, work_date, float_time):
+    def _float_to_utc_datetime(self, work_date, float_time, user_tz=None):
         """Convert float time to UTC datetime considering user's timezone"""
         hours = int(float_time)
         minutes = int((float_time - hours) * 60)
@@ -58,7 +64,7 @@ class HrAttendanceWizard(models.TransientModel):
         local_dt = datetime.combine(work_date, datetime.min.time()) + timedelta(hours=hours, minutes=minutes)
         
         # Convert to user's timezone, then to UTC
-        user_tz = self._get_user_timezone()
+        user_tz = user_tz or self._get_user_timezone()
         local_dt = user_tz.localize(local_dt)
         utc_dt = local_dt.astimezone(pytz.UTC)
         
@@ -70,40 +76,38 @@ class HrAttendanceWizard(models.TransientModel):
         self.ensure_one()
         
         Attendance = self.env['hr.attendance']
-        created_count = 0
-        skipped_count = 0
         
-        for employee in self.employee_ids:
-            # Check if attendance already exists for this date (in UTC)
-            user_tz = self._get_user_timezone()
-            date_start_local = datetime.combine(self.attendance_date, datetime.min.time())
-            date_end_local = datetime.combine(self.attendance_date, datetime.max.time())
-            
-            # Convert to UTC for search
-            date_start_utc = user_tz.localize(date_start_local).astimezone(pytz.UTC).replace(tzinfo=None)
-            date_end_utc = user_tz.localize(date_end_local).astimezone(pytz.UTC).replace(tzinfo=None)
-            
-            existing = Attendance.search([
-                ('employee_id', '=', employee.id),
-                ('check_in', '>=', date_start_utc),
-                ('check_in', '<=', date_end_utc),
-            ], limit=1)
-            
-            if existing:
-                skipped_count += 1
-                continue
-            
-            # Convert to UTC datetime
-            check_in = self._float_to_utc_datetime(self.attendance_date, self.check_in_time)
-            check_out = self._float_to_utc_datetime(self.attendance_date, self.check_out_time)
-            
-            # Create attendance
-            Attendance.create({
-                'employee_id': employee.id,
-                'check_in': check_in,
-                'check_out': check_out,
-            })
-            created_count += 1
+        # Attendance date window in UTC (same for every employee)
+        user_tz = self._get_user_timezone()
+        date_start_local = datetime.combine(self.attendance_date, datetime.min.time())
+        date_end_local = datetime.combine(self.attendance_date, datetime.max.time())
+        date_start_utc = user_tz.localize(date_start_local).astimezone(pytz.UTC).replace(tzinfo=None)
+        date_end_utc = user_tz.localize(date_end_local).astimezone(pytz.UTC).replace(tzinfo=None)
+        
+        employee_ids = self.employee_ids.ids
+        
+        # Employees who already have attendance for this date - one grouped query
+        groups = Attendance._read_group([
+            ('employee_id', 'in', employee_ids),
+            ('check_in', '>=', date_start_utc),
+            ('check_in', '<=', date_end_utc),
+        ], ['employee_id'])
+        existing_emp_ids = {employee.id for employee, in groups}
+        
+        # Convert to UTC datetime (same for every employee)
+        check_in = self._float_to_utc_datetime(self.attendance_date, self.check_in_time, user_tz)
+        check_out = self._float_to_utc_datetime(self.attendance_date, self.check_out_time, user_tz)
+        
+        vals_list = [{
+            'employee_id': eid,
+            'check_in': check_in,
+            'check_out': check_out,
+        } for eid in employee_ids if eid not in existing_emp_ids]
+        
+        # Create all attendances at once
+        Attendance.create(vals_list)
+        created_count = len(vals_list)
+        skipped_count = len(employee_ids) - created_count
         
         # Return notification
         message = f"{created_count} ta attendance yaratildi."
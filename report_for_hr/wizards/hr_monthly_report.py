@@ -1,17 +1,43 @@
 # -*- coding: utf-8 -*-
 
 from odoo import models, fields, api
-from datetime import datetime, timedelta
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
 from calendar import monthrange
 import base64
+import functools
 import io
-import pytz
+from zoneinfo import ZoneInfo
 
 try:
     import xlsxwriter
 except ImportError:
     xlsxwriter = None
 
+# Employees processed per prefetch batch when generating the monthly report
+EMPLOYEE_BATCH_SIZE = 1000
+
+# Separator of the per-day values packed into hr.monthly.report.line.days_data
+DAYS_DATA_SEPARATOR = '|'
+
+# Field names of the daily columns, DAY_FIELDS[0] == 'day_1'
+DAY_FIELDS = tuple(f'day_{day}' for day in range(1, 32))
+
+# 'HH:MM' strings for every minute of a day, indexed by total minutes
+_HM = tuple(f"{m // 60:02d}:{m % 60:02d}" for m in range(24 * 60 + 1))
+
+
+@functools.lru_cache(maxsize=128)
+def _month_days(year, month):
+    """Cached number of days in a month"""
+    return monthrange(year, month)[1]
+
+
+def _format_hours(hours):
+    """Float hours -> 'H:MM' total string"""
+    total_minutes = round(hours * 60)
+    return f"{total_minutes // 60}:{total_minutes % 60:02d}"
+
 
 class HrMonthlyReport(models.TransientModel):
     _name = 'hr.monthly.report'
@@ -61,13 +87,10 @@ class HrMonthlyReport(models.TransientModel):
     
     @api.depends('month', 'year')
     def _compute_days_in_month(self):
-        import calendar
         for record in self:
             if record.month and record.year:
                 try:
-                    month = int(record.month)
-                    year = int(record.year)
-                    record.days_in_month = calendar.monthrange(year, month)[1]
+                    record.days_in_month = _month_days(int(record.year), int(record.month))
                 except (ValueError, TypeError):
                     record.days_in_month = 31
             else:
@@ -78,13 +101,37 @@ class HrMonthlyReport(models.TransientModel):
         """Generate monthly report data"""
         self.ensure_one()
         
-        # Clear existing lines
-        self.line_ids.unlink()
+        # Clear existing lines with one DELETE (transient lines have no unlink hooks)
+        self.env['hr.monthly.report.line'].flush_model()
+        self.env.cr.execute(
+            "DELETE FROM hr_monthly_report_line WHERE report_id = %s", [self.id]
+        )
+        self.env['hr.monthly.report.line'].invalidate_model()
+        self.invalidate_recordset(['line_ids'])
+        
+        self.env['hr.monthly.report.line'].create(self._compute_lines_data())
+        
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': 'hr.monthly.report',
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    def action_generate_and_export(self):
+        """Compute the report and export it to Excel without storing report lines"""
+        self.ensure_one()
+        return self._write_excel(self._compute_lines_data())
+
+    def _compute_lines_data(self):
+        """Compute the report lines as a list of hr.monthly.report.line values"""
+        self.ensure_one()
         
         # Get date range for the month
         year = int(self.year)
         month = int(self.month)
-        last_day_num = monthrange(year, month)[1]
+        last_day_num = _month_days(year, month)
         
         # Create dictionary of all dates in month
         month_dates = {}
@@ -100,6 +147,29 @@ class HrMonthlyReport(models.TransientModel):
         if self.department_id:
             domain.append(('department_id', '=', self.department_id.id))
         employees = self.env['hr.employee'].search(domain)
+
+        # Prefetch all working schedules and their lines in one go
+        calendars = employees.resource_calendar_id | self.env.company.resource_calendar_id
+        calendars.attendance_ids.fetch(['calendar_id', 'dayofweek', 'day_period', 'hour_from', 'hour_to'])
+
+        # calendar_id -> dayofweek -> {'work': [(hour_from, hour_to)], 'lunch': [...],
+        #                              'end': scheduled end hour, 'overtime_lunch': [...]}
+        schedule_table = defaultdict(lambda: defaultdict(
+            lambda: {'work': [], 'lunch': [], 'end': None, 'overtime_lunch': []}
+        ))
+        for sched in calendars.attendance_ids:
+            period = 'lunch' if sched.day_period == 'lunch' else 'work'
+            schedule_table[sched.calendar_id.id][sched.dayofweek][period].append(
+                (sched.hour_from, sched.hour_to)
+            )
+        # Overtime needs the day's scheduled end and the lunch to deduct: the day's
+        # own lunch, or Monday's lunch when the day has none (e.g. weekends)
+        for calendar_id in calendars.ids:
+            calendar_table = schedule_table[calendar_id]
+            for day_of_week in map(str, range(7)):
+                periods = calendar_table[day_of_week]
+                periods['end'] = max((seg_end for _seg_start, seg_end in periods['work']), default=None)
+                periods['overtime_lunch'] = periods['lunch'] or calendar_table['0']['lunch']
         
         # Helper to check global leaves (Public Holidays)
         # Assuming resource.calendar.leaves stores global leaves with resource_id=False
@@ -109,251 +179,256 @@ class HrMonthlyReport(models.TransientModel):
             ('date_to', '>=', datetime.combine(first_date, datetime.min.time())),
         ])
         
-        def is_public_holiday(check_date):
-            dt = datetime.combine(check_date, datetime.min.time())
-            for holiday in public_holidays:
-                if holiday.date_from <= dt <= holiday.date_to:
-                    return True
-            return False
+        # Expand holidays to the set of month dates whose midnight they cover
+        holiday_dates = set()
+        for holiday in public_holidays:
+            start = holiday.date_from.date()
+            if datetime.combine(start, datetime.min.time()) < holiday.date_from:
+                start += timedelta(days=1)
+            start = max(start, first_date)
+            end = min(holiday.date_to.date(), last_date)
+            holiday_dates.update(start + timedelta(days=i) for i in range((end - start).days + 1))
+        holiday_dates = frozenset(holiday_dates)
+
+        user_tz = ZoneInfo(self.env.user.tz or 'Asia/Tashkent')
+
+        # If the timezone keeps one UTC offset for the whole month (no DST switch,
+        # e.g. Asia/Tashkent) convert with plain arithmetic instead of astimezone
+        window_start = datetime.combine(first_date, datetime.min.time()) - timedelta(days=1)
+        month_offsets = {
+            (window_start + timedelta(days=i)).replace(tzinfo=timezone.utc).astimezone(user_tz).utcoffset()
+            for i in range(last_day_num + 3)
+        }
+        tz_offset = month_offsets.pop() if len(month_offsets) == 1 else None
+
+        def to_local_hour(dt):
+            """UTC datetime -> local hour of day as float"""
+            if tz_offset is not None:
+                local = dt + tz_offset
+            else:
+                local = dt.replace(tzinfo=timezone.utc).astimezone(user_tz)
+            return local.hour + local.minute / 60.0
+
+        # Batch-load attendances, leaves and approved overtime for all employees
+        # at once instead of three searches per employee. Attendances and overtime
+        # are kept as plain (date, check_in_hour, check_out_hour) tuples, converted
+        # to local time once here.
+        attendances_by_emp = defaultdict(list)
+        for att in self.env['hr.attendance'].search_fetch([
+            ('employee_id', 'in', employees.ids),
+            ('check_in', '>=', datetime.combine(first_date, datetime.min.time())),
+            ('check_in', '<=', datetime.combine(last_date, datetime.max.time())),
+            ('check_out', '!=', False),  # Open attendances have no worked time yet
+        ], ['employee_id', 'check_in', 'check_out']):
+            attendances_by_emp[att.employee_id.id].append(
+                (att.check_in.date(), to_local_hour(att.check_in), to_local_hour(att.check_out))
+            )
+
+        leaves_by_emp = defaultdict(list)
+        for leave in self.env['hr.leave'].search_fetch([
+            ('employee_id', 'in', employees.ids),
+            ('state', '=', 'validate'),
+            ('date_from', '<=', last_date),
+            ('date_to', '>=', first_date),
+        ], ['employee_id', 'date_from', 'date_to']):
+            leaves_by_emp[leave.employee_id.id].append(leave)
+
+        overtimes_by_emp = defaultdict(list)
+        for ot in self.env['hr.attendance.overtime.line'].search_fetch([
+            ('employee_id', 'in', employees.ids),
+            ('date', '>=', first_date),
+            ('date', '<=', last_date),
+            ('status', '=', 'approved'),  # Only approved
+            ('time_start', '!=', False),
+            ('time_stop', '!=', False),
+        ], ['employee_id', 'date', 'time_start', 'time_stop']):
+            overtimes_by_emp[ot.employee_id.id].append(
+                (ot.date, to_local_hour(ot.time_start), to_local_hour(ot.time_stop))
+            )
+
+        # Convert grace periods from minutes to hours (read from settings)
+        grace = self.env['hr.report.settings'].get_grace_minutes()
+        late_grace_hours = grace['late'] / 60.0
+        early_leave_grace_hours = grace['early'] / 60.0
 
         lines = []
-        for emp in employees:
-            # Get employee's calendar for schedule
-            calendar = emp.resource_calendar_id or self.env.company.resource_calendar_id
-            user_tz = pytz.timezone(self.env.user.tz or 'Asia/Tashkent')
-            
-            # 1. Get attendances for this employee in this month
-            attendances = self.env['hr.attendance'].search([
-                ('employee_id', '=', emp.id),
-                ('check_in', '>=', datetime.combine(first_date, datetime.min.time())),
-                ('check_in', '<=', datetime.combine(last_date, datetime.max.time())),
-            ])
-            
-            # Get leaves for this employee FIRST (needed for attendance_map filtering)
-            leaves = self.env['hr.leave'].search([
-                ('employee_id', '=', emp.id),
-                ('state', '=', 'validate'),
-                ('date_from', '<=', last_date),
-                ('date_to', '>=', first_date),
-            ])
-            
-            leave_dates = set()
-            for leave in leaves:
-                # Iterate each day of leave
-                current = leave.date_from.date()
-                end = leave.date_to.date()
-                while current <= end:
-                    if first_date <= current <= last_date:
-                        leave_dates.add(current)
-                    current += timedelta(days=1)
-            
-            attendance_map = {}  # date -> scheduled hours only (not extra time)
-            for att in attendances:
-                if not att.check_in or not att.check_out:
-                    continue
-                    
-                d = att.check_in.date()
-                day_of_week = str(d.weekday())  # 0=Monday, 6=Sunday
-                
-                # Skip leave days - they will be counted as overtime if approved
-                if d in leave_dates:
-                    continue
-                
-                # Get schedule for this day (exclude lunch/break periods)
-                schedule_lines = calendar.attendance_ids.filtered(
-                    lambda a: a.dayofweek == day_of_week and a.day_period != 'lunch'
-                )
-                
-                if not schedule_lines:
-                    # No schedule for this day (non-work day) - skip adding to total hours
-                    # This time will be counted as overtime if approved
-                    continue
-                
-                # Convert check_in and check_out to local timezone
-                check_in_utc = att.check_in.replace(tzinfo=pytz.UTC)
-                check_in_local = check_in_utc.astimezone(user_tz)
-                check_in_hour = check_in_local.hour + check_in_local.minute / 60.0
-                
-                check_out_utc = att.check_out.replace(tzinfo=pytz.UTC)
-                check_out_local = check_out_utc.astimezone(user_tz)
-                check_out_hour = check_out_local.hour + check_out_local.minute / 60.0
-                
-                # Convert grace periods from minutes to hours (read from settings)
-                grace = self.env['hr.report.settings'].get_grace_minutes()
-                late_grace_hours = grace['late'] / 60.0
-                early_leave_grace_hours = grace['early'] / 60.0
-                
-                # Calculate worked hours for each schedule segment separately
-                # This way lunch break is automatically excluded
-                worked_within_schedule = 0.0
-                for sched in schedule_lines:
-                    seg_start = sched.hour_from
-                    seg_end = sched.hour_to
-                    
-                    # Apply grace period for late arrival
-                    # If employee arrived within grace period after segment start, count from segment start
-                    if check_in_hour > seg_start and check_in_hour <= (seg_start + late_grace_hours):
-                        effective_check_in = seg_start
-                    else:
-                        effective_check_in = check_in_hour
-                    
-                    # Apply grace period for early departure
-                    # If employee left within grace period before segment end, count until segment end
-                    if check_out_hour < seg_end and check_out_hour >= (seg_end - early_leave_grace_hours):
-                        effective_check_out = seg_end
-                    else:
-                        effective_check_out = check_out_hour
-                    
-                    # Find overlap between attendance and this schedule segment
-                    overlap_start = max(effective_check_in, seg_start)
-                    overlap_end = min(effective_check_out, seg_end)
-                    
-                    if overlap_end > overlap_start:
-                        worked_within_schedule += overlap_end - overlap_start
-                
-                attendance_map[d] = attendance_map.get(d, 0.0) + worked_within_schedule
-            
-            # 2. Get Work Days from Calendar (exclude lunch periods)
-            work_days_of_week = set(int(d) for d in calendar.attendance_ids.filtered(lambda a: a.day_period != 'lunch').mapped('dayofweek'))
-            
-            total_hours = sum(attendance_map.values())
-            
-            # Calculate overtime - only LATE DEPARTURE (kech ketgan), not early arrival
-            # Only count approved overtime
-            total_overtime = 0.0
-            
-            # Get approved overtime records for this employee in this month
-            overtime_records = self.env['hr.attendance.overtime.line'].search([
-                ('employee_id', '=', emp.id),
-                ('date', '>=', first_date),
-                ('date', '<=', last_date),
-                ('status', '=', 'approved'),  # Only approved
-            ])
-            
-            for ot in overtime_records:
-                if not ot.time_stop or not ot.time_start:
-                    continue
-                    
-                # Get scheduled end time for this day from employee's calendar
+        # Walk employees in bounded batches so each batch prefetches only its own records
+        for batch_start in range(0, len(employees), EMPLOYEE_BATCH_SIZE):
+            batch = employees[batch_start:batch_start + EMPLOYEE_BATCH_SIZE].with_prefetch()
+            for emp in batch:
+                # Get employee's calendar for schedule
                 calendar = emp.resource_calendar_id or self.env.company.resource_calendar_id
-                day_of_week = str(ot.date.weekday())  # 0=Monday, 6=Sunday
-                
-                # Find the scheduled times for this day (exclude lunch)
-                schedule_lines = calendar.attendance_ids.filtered(
-                    lambda a: a.dayofweek == day_of_week and a.day_period != 'lunch'
-                )
-                
-                # Convert times from UTC to local timezone
-                user_tz = pytz.timezone(self.env.user.tz or 'Asia/Tashkent')
-                check_in_utc = ot.time_start.replace(tzinfo=pytz.UTC)
-                check_in_local = check_in_utc.astimezone(user_tz)
-                check_in_hour = check_in_local.hour + check_in_local.minute / 60.0
-                
-                check_out_utc = ot.time_stop.replace(tzinfo=pytz.UTC)
-                check_out_local = check_out_utc.astimezone(user_tz)
-                check_out_hour = check_out_local.hour + check_out_local.minute / 60.0
-                
-                if not schedule_lines or ot.date in leave_dates:
-                    # Non-work day (dam olish kuni) - count worked time as overtime BUT deduct lunch
-                    overtime_hours = check_out_hour - check_in_hour
-                    
-                    # Find lunch/break periods for this day (even if it's a non-work day, we check standard schedule)
-                    lunch_lines = calendar.attendance_ids.filtered(
-                        lambda a: a.dayofweek == day_of_week and a.day_period == 'lunch'
-                    )
-                    
-                    # If no lunch found for this day (e.g. weekend), try fetching Monday's lunch schedule as fallback
-                    if not lunch_lines:
-                         lunch_lines = calendar.attendance_ids.filtered(
-                            lambda a: a.dayofweek == '0' and a.day_period == 'lunch'
-                        )
-                    
-                    # Deduct lunch duration if it overlaps with worked time
-                    for lunch in lunch_lines:
-                        # Find overlap between worked time and lunch time
-                        overlap_start = max(check_in_hour, lunch.hour_from)
-                        overlap_end = min(check_out_hour, lunch.hour_to)
-                        
+
+                # 1. Get attendances for this employee in this month
+                attendances = attendances_by_emp[emp.id]
+
+                # Get leaves for this employee FIRST (needed for attendance_map filtering)
+                leaves = leaves_by_emp[emp.id]
+
+                leave_dates = set()
+                for leave in leaves:
+                    # Add each day of leave, clipped to the month
+                    start = max(leave.date_from.date(), first_date)
+                    end = min(leave.date_to.date(), last_date)
+                    leave_dates.update(start + timedelta(days=i) for i in range((end - start).days + 1))
+
+                leave_dates = frozenset(leave_dates)
+
+                attendance_map = defaultdict(float)  # date -> scheduled hours only (not extra time)
+                for d, check_in_hour, check_out_hour in attendances:
+                    day_of_week = str(d.weekday())  # 0=Monday, 6=Sunday
+
+                    # Skip leave days - they will be counted as overtime if approved
+                    if d in leave_dates:
+                        continue
+
+                    # Get schedule for this day (exclude lunch/break periods)
+                    work_segments = schedule_table[calendar.id][day_of_week]['work']
+
+                    if not work_segments:
+                        # No schedule for this day (non-work day) - skip adding to total hours
+                        # This time will be counted as overtime if approved
+                        continue
+
+                    # Calculate worked hours for each schedule segment separately
+                    # This way lunch break is automatically excluded
+                    worked_within_schedule = 0.0
+                    for seg_start, seg_end in work_segments:
+                        # Apply grace period for late arrival
+                        # If employee arrived within grace period after segment start, count from segment start
+                        if check_in_hour > seg_start and check_in_hour <= (seg_start + late_grace_hours):
+                            effective_check_in = seg_start
+                        else:
+                            effective_check_in = check_in_hour
+
+                        # Apply grace period for early departure
+                        # If employee left within grace period before segment end, count until segment end
+                        if check_out_hour < seg_end and check_out_hour >= (seg_end - early_leave_grace_hours):
+                            effective_check_out = seg_end
+                        else:
+                            effective_check_out = check_out_hour
+
+                        # Find overlap between attendance and this schedule segment
+                        overlap_start = max(effective_check_in, seg_start)
+                        overlap_end = min(effective_check_out, seg_end)
+
                         if overlap_end > overlap_start:
-                            deduction = overlap_end - overlap_start
-                            overtime_hours -= deduction
-                            
-                    if overtime_hours > 0:
-                        total_overtime += overtime_hours
-                else:
-                    # Work day - only count late departure time
-                    scheduled_end_hour = max(schedule_lines.mapped('hour_to'))
-                    if check_out_hour > scheduled_end_hour:
-                        late_hours = check_out_hour - scheduled_end_hour
-                        total_overtime += late_hours
-            
-            worked_days = len(attendance_map)
-            
-            # Prepare line data
-            line_data = {
-                'report_id': self.id,
-                'employee_id': emp.id,
-                'department_id': emp.department_id.id,
-                'worked_days': worked_days,
-                'total_hours': total_hours,
-                'total_overtime': total_overtime,
-            }
-            
-            # Fill daily columns
-            for current_date, day_num in month_dates.items():
-                field_name = f'day_{day_num}'
-                
-                # Logic Priority:
-                # 1. Attendance (Actual work done) -> Show Hours
-                if current_date in attendance_map:
-                    hours = attendance_map[current_date]
-                    total_minutes = round(hours * 60)  # Convert to minutes and round
-                    h = total_minutes // 60
-                    m = total_minutes % 60
-                    line_data[field_name] = f"{h:02d}:{m:02d}"
-                    continue
-                
-                # 2. Public Holiday -> 'B'
-                if is_public_holiday(current_date):
-                    line_data[field_name] = 'B'
-                    continue
-                
-                # 3. Employee Leave -> 'T'
-                if current_date in leave_dates:
-                    line_data[field_name] = 'T'
-                    continue
-                
-                # 4. Day Off (Weekend/Not in schedule) -> 'D'
-                # weekday(): Mon=0, Sun=6
-                if current_date.weekday() not in work_days_of_week:
-                    line_data[field_name] = 'D'
-                    continue
-                
-                # 5. Absent (Work day, no attendance, no leave, no holiday) -> Empty
-                line_data[field_name] = ''
-
-            lines.append(line_data)
-        
-        self.env['hr.monthly.report.line'].create(lines)
-        
-        return {
-            'type': 'ir.actions.act_window',
-            'res_model': 'hr.monthly.report',
-            'res_id': self.id,
-            'view_mode': 'form',
-            'target': 'new',
-        }
+                            worked_within_schedule += overlap_end - overlap_start
+
+                    attendance_map[d] += worked_within_schedule
+
+                # 2. Get Work Days from Calendar (exclude lunch periods)
+                work_days_of_week = frozenset(
+                    int(dow) for dow, periods in schedule_table[calendar.id].items() if periods['work']
+                )
+
+                total_hours = sum(attendance_map.values())
+
+                # Calculate overtime - only LATE DEPARTURE (kech ketgan), not early arrival
+                # Only count approved overtime
+                total_overtime = 0.0
+
+                # Get approved overtime records for this employee in this month
+                overtime_records = overtimes_by_emp[emp.id]
+
+                for ot_date, check_in_hour, check_out_hour in overtime_records:
+                    # Scheduled times for this day from employee's calendar
+                    day_schedule = schedule_table[calendar.id][str(ot_date.weekday())]  # 0=Monday, 6=Sunday
+
+                    if not day_schedule['work'] or ot_date in leave_dates:
+                        # Non-work day (dam olish kuni) - count worked time as overtime BUT deduct lunch
+                        overtime_hours = check_out_hour - check_in_hour
+
+                        # Deduct lunch duration if it overlaps with worked time
+                        # (Monday's lunch is used for days without one, e.g. weekends)
+                        for lunch_start, lunch_end in day_schedule['overtime_lunch']:
+                            # Find overlap between worked time and lunch time
+                            overlap_start = max(check_in_hour, lunch_start)
+                            overlap_end = min(check_out_hour, lunch_end)
+
+                            if overlap_end > overlap_start:
+                                deduction = overlap_end - overlap_start
+                                overtime_hours -= deduction
+
+                        if overtime_hours > 0:
+                            total_overtime += overtime_hours
+                    else:
+                        # Work day - only count late departure time
+                        scheduled_end_hour = day_schedule['end']
+                        if check_out_hour > scheduled_end_hour:
+                            late_hours = check_out_hour - scheduled_end_hour
+                            total_overtime += late_hours
+
+                worked_days = len(attendance_map)
+
+                # Prepare line data
+                line_data = {
+                    'report_id': self.id,
+                    'employee_id': emp.id,
+                    'department_id': emp.department_id.id,
+                    'worked_days': worked_days,
+                    'total_hours': total_hours,
+                    'total_overtime': total_overtime,
+                }
+
+                # Fill daily columns (packed into days_data, one slot per day)
+                day_values = []
+                for current_date in month_dates:
+                    # Logic Priority:
+                    # 1. Attendance (Actual work done) -> Show Hours
+                    if current_date in attendance_map:
+                        hours = attendance_map[current_date]
+                        total_minutes = round(hours * 60)  # Convert to minutes and round
+                        if total_minutes < len(_HM):
+                            day_values.append(_HM[total_minutes])
+                        else:
+                            day_values.append(f"{total_minutes // 60:02d}:{total_minutes % 60:02d}")
+                        continue
+
+                    # 2. Public Holiday -> 'B'
+                    if current_date in holiday_dates:
+                        day_values.append('B')
+                        continue
+
+                    # 3. Employee Leave -> 'T'
+                    if current_date in leave_dates:
+                        day_values.append('T')
+                        continue
+
+                    # 4. Day Off (Weekend/Not in schedule) -> 'D'
+                    # weekday(): Mon=0, Sun=6
+                    if current_date.weekday() not in work_days_of_week:
+                        day_values.append('D')
+                        continue
+
+                    # 5. Absent (Work day, no attendance, no leave, no holiday) -> Empty
+                    day_values.append('')
+
+                line_data['days_data'] = DAYS_DATA_SEPARATOR.join(day_values)
+                lines.append(line_data)
+
+        return lines
 
     def action_export_excel(self):
         """Export report to Excel"""
         self.ensure_one()
-        
+        # One read of all lines; load=None keeps many2one values as plain ids
+        lines_data = self.line_ids.read([
+            'employee_id', 'department_id', 'days_data',
+            'worked_days', 'total_hours', 'total_overtime',
+        ], load=None)
+        return self._write_excel(lines_data)
+
+    def _write_excel(self, lines_data):
+        """Write report line values to an Excel file and return its download action"""
         if not xlsxwriter:
             raise Exception("xlsxwriter kutubxonasi o'rnatilmagan!")
         
-        # Create Excel file in memory
+        # Create Excel file; constant_memory flushes each finished row to a temp
+        # file instead of keeping the whole sheet in memory (rows are written
+        # strictly top to bottom below)
         output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+        workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
         worksheet = workbook.add_worksheet('Hisobot')
         
         # Styles
@@ -385,7 +460,7 @@ class HrMonthlyReport(models.TransientModel):
         # Headers
         headers = ['#', 'Xodim', "Bo'lim"]
         # Add day headers 1-31
-        days_in_month = monthrange(int(self.year), int(self.month))[1]
+        days_in_month = _month_days(int(self.year), int(self.month))
         for day in range(1, days_in_month + 1):
             headers.append(str(day))
         
@@ -403,49 +478,42 @@ class HrMonthlyReport(models.TransientModel):
         worksheet.set_column('D:AH', 5) # Days 1-31 (approx)
         worksheet.set_column('AI:AK', 12) # Totals
         
+        # Employee and department names of all rows in one read each
+        employees = self.env['hr.employee'].browse({line['employee_id'] for line in lines_data})
+        employee_names = {employee.id: employee.name for employee in employees}
+        departments = self.env['hr.department'].browse(
+            {line['department_id'] for line in lines_data if line['department_id']}
+        )
+        department_names = {department.id: department.name for department in departments}
+        
         # Data rows
         row = 3
-        for idx, line in enumerate(self.line_ids, 1):
-            worksheet.write(row, 0, idx, cell_format)
-            worksheet.write(row, 1, line.employee_id.name, name_format)
-            worksheet.write(row, 2, line.department_id.name or '', name_format)
-            
-            col = 3
-            # Write days 1 to days_in_month
-            for day in range(1, days_in_month + 1):
-                val = getattr(line, f'day_{day}') or ''
-                worksheet.write(row, col, val, cell_format)
-                col += 1
-            
-            # Works days
-            worksheet.write(row, col, line.worked_days, cell_format)
-            col += 1
+        for idx, line in enumerate(lines_data, 1):
+            # Days 1 to days_in_month, straight from the packed days_data
+            day_values = line['days_data'].split(DAYS_DATA_SEPARATOR) if line['days_data'] else []
+            day_values = day_values[:days_in_month]
+            day_values += [''] * (days_in_month - len(day_values))
             
-            # Total Hours
-            total_minutes = round(line.total_hours * 60)
-            hours = total_minutes // 60
-            minutes = total_minutes % 60
-            worksheet.write(row, col, f"{hours}:{minutes:02d}", cell_format)
-            col += 1
-            
-            # Total Overtime
-            total_minutes = round(line.total_overtime * 60)
-            hours = total_minutes // 60
-            minutes = total_minutes % 60
-            worksheet.write(row, col, f"{hours}:{minutes:02d}", cell_format)
+            worksheet.write_number(row, 0, idx, cell_format)
+            worksheet.write_row(row, 1, [
+                employee_names[line['employee_id']],
+                department_names.get(line['department_id'], ''),
+            ], name_format)
+            # Days, worked days, total hours, total overtime
+            worksheet.write_row(row, 3, day_values + [
+                line['worked_days'],
+                _format_hours(line['total_hours']),
+                _format_hours(line['total_overtime']),
+            ], cell_format)
             
             row += 1
         
         workbook.close()
         
-        # Get Excel data
-        output.seek(0)
-        excel_data = output.read()
-        
-        # Save to record
+        # Save to record (encode straight from the buffer, without a copy)
         filename = f"oylik_hisobot_{month_names[self.month]}_{self.year}.xlsx"
         self.write({
-            'excel_file': base64.b64encode(excel_data),
+            'excel_file': base64.b64encode(output.getbuffer()),
             'excel_filename': filename,
         })
         
@@ -488,38 +556,41 @@ class HrMonthlyReportLine(models.TransientModel):
         compute='_compute_hours_display'
     )
     
-    # Daily fields - Char for status chars or time string
-    day_1 = fields.Char(string='1')
-    day_2 = fields.Char(string='2')
-    day_3 = fields.Char(string='3')
-    day_4 = fields.Char(string='4')
-    day_5 = fields.Char(string='5')
-    day_6 = fields.Char(string='6')
-    day_7 = fields.Char(string='7')
-    day_8 = fields.Char(string='8')
-    day_9 = fields.Char(string='9')
-    day_10 = fields.Char(string='10')
-    day_11 = fields.Char(string='11')
-    day_12 = fields.Char(string='12')
-    day_13 = fields.Char(string='13')
-    day_14 = fields.Char(string='14')
-    day_15 = fields.Char(string='15')
-    day_16 = fields.Char(string='16')
-    day_17 = fields.Char(string='17')
-    day_18 = fields.Char(string='18')
-    day_19 = fields.Char(string='19')
-    day_20 = fields.Char(string='20')
-    day_21 = fields.Char(string='21')
-    day_22 = fields.Char(string='22')
-    day_23 = fields.Char(string='23')
-    day_24 = fields.Char(string='24')
-    day_25 = fields.Char(string='25')
-    day_26 = fields.Char(string='26')
-    day_27 = fields.Char(string='27')
-    day_28 = fields.Char(string='28')
-    day_29 = fields.Char(string='29')
-    day_30 = fields.Char(string='30')
-    day_31 = fields.Char(string='31')
+    # Daily values packed as 'HH:MM|B|T|D|...', one slot per day of the month
+    days_data = fields.Char(string='Kunlik qiymatlar')
+
+    # Daily fields - Char for status chars or time string, unpacked from days_data
+    day_1 = fields.Char(string='1', compute='_compute_day_fields')
+    day_2 = fields.Char(string='2', compute='_compute_day_fields')
+    day_3 = fields.Char(string='3', compute='_compute_day_fields')
+    day_4 = fields.Char(string='4', compute='_compute_day_fields')
+    day_5 = fields.Char(string='5', compute='_compute_day_fields')
+    day_6 = fields.Char(string='6', compute='_compute_day_fields')
+    day_7 = fields.Char(string='7', compute='_compute_day_fields')
+    day_8 = fields.Char(string='8', compute='_compute_day_fields')
+    day_9 = fields.Char(string='9', compute='_compute_day_fields')
+    day_10 = fields.Char(string='10', compute='_compute_day_fields')
+    day_11 = fields.Char(string='11', compute='_compute_day_fields')
+    day_12 = fields.Char(string='12', compute='_compute_day_fields')
+    day_13 = fields.Char(string='13', compute='_compute_day_fields')
+    day_14 = fields.Char(string='14', compute='_compute_day_fields')
+    day_15 = fields.Char(string='15', compute='_compute_day_fields')
+    day_16 = fields.Char(string='16', compute='_compute_day_fields')
+    day_17 = fields.Char(string='17', compute='_compute_day_fields')
+    day_18 = fields.Char(string='18', compute='_compute_day_fields')
+    day_19 = fields.Char(string='19', compute='_compute_day_fields')
+    day_20 = fields.Char(string='20', compute='_compute_day_fields')
+    day_21 = fields.Char(string='21', compute='_compute_day_fields')
+    day_22 = fields.Char(string='22', compute='_compute_day_fields')
+    day_23 = fields.Char(string='23', compute='_compute_day_fields')
+    day_24 = fields.Char(string='24', compute='_compute_day_fields')
+    day_25 = fields.Char(string='25', compute='_compute_day_fields')
+    day_26 = fields.Char(string='26', compute='_compute_day_fields')
+    day_27 = fields.Char(string='27', compute='_compute_day_fields')
+    day_28 = fields.Char(string='28', compute='_compute_day_fields')
+    day_29 = fields.Char(string='29', compute='_compute_day_fields')
+    day_30 = fields.Char(string='30', compute='_compute_day_fields')
+    day_31 = fields.Char(string='31', compute='_compute_day_fields')
     
     # Related field for dynamic visibility of day columns
     days_in_month = fields.Integer(
@@ -527,17 +598,15 @@ class HrMonthlyReportLine(models.TransientModel):
         store=True
     )
 
+    @api.depends('days_data')
+    def _compute_day_fields(self):
+        for record in self:
+            values = record.days_data.split(DAYS_DATA_SEPARATOR) if record.days_data else []
+            for index, field_name in enumerate(DAY_FIELDS):
+                record[field_name] = values[index] if index < len(values) else False
+
     @api.depends('total_hours', 'total_overtime')
     def _compute_hours_display(self):
         for record in self:
-            # Hours
-            total_minutes = round(record.total_hours * 60)
-            hours = total_minutes // 60
-            minutes = total_minutes % 60
-            record.total_hours_display = f"{hours}:{minutes:02d}"
-            
-            # Overtime
-            total_minutes = round(record.total_overtime * 60)
-            hours = total_minutes // 60
-            minutes = total_minutes % 60
-            record.total_overtime_display = f"{hours}:{minutes:02d}"
+            record.total_hours_display = _format_hours(record.total_hours)
+            record.total_overtime_display = _format_hours(record.total_overtime)